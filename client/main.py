@@ -46,6 +46,7 @@ class SimpleGameClient:
         self.app_state = "menu"  # menu | game
         self.menu_choice = None   # (action, token)
         self.victory = False
+        self.maze = []  # local copy, kept in sync from full grids and per-tick diffs
 
     def init_display(self):
         """Initialize display"""
@@ -63,6 +64,16 @@ class SimpleGameClient:
             print(f"Display initialization failed: {e}")
             return False
 
+    def apply_maze_update(self, data):
+        """Apply a full maze or a per-tick maze diff from a game state message"""
+        maze = data.get('maze')
+        if maze:
+            self.maze = maze
+        elif self.maze:
+            cols = len(self.maze[0])
+            for idx, value in data.get('maze_diff', ()):
+                self.maze[idx // cols][idx % cols] = value
+
     def draw_maze(self, surface, maze):
         """Draw classic Pac-Man style maze"""
         for y, row in enumerate(maze):
@@ -480,12 +491,11 @@ class SimpleGameClient:
             
             await asyncio.sleep(1/60)
 
-    async def game_loop(self, websocket):
-        """Main game loop"""
-        while True:
-            try:
-                # Receive game state
-                message = await asyncio.wait_for(websocket.recv(), timeout=0.1)
+    async def _receive_loop(self, websocket):
+        """Read server frames as they arrive and keep the latest state in
+        self.last_data. Returns on a server error or when the connection closes."""
+        try:
+            async for message in websocket:
                 data = json.loads(message)
                 
                 # Handle control/error messages
@@ -493,7 +503,7 @@ class SimpleGameClient:
                     # Stop on server error
                     msg = data.get("message") or data.get("error") or "Unknown error"
                     print(f"Server error: {msg}")
-                    break
+                    return
                 
                 # Handle room assignment messages
                 if data.get("type") == "room_assignment":
@@ -503,63 +513,86 @@ class SimpleGameClient:
                     continue
                 
                 self.last_data = data
-            except asyncio.TimeoutError:
+                self.apply_maze_update(data)
+                # Secondary messages (e.g. rate-limit notices) batched into the state frame
+                for event in data.get('events', ()):
+                    print(f"Server: {event.get('message', event.get('type'))}")
+        except websockets.ConnectionClosed:
+            pass
+        except Exception as e:
+            print(f"Game loop error: {e}")
+
+    async def game_loop(self, websocket):
+        """Main game loop. A separate task receives frames with a plain recv, so
+        there is no per-message timeout; this loop renders the latest state at up
+        to 60 FPS until the receiver stops."""
+        receiver = asyncio.create_task(self._receive_loop(websocket))
+        rendered = None
+        try:
+            while not receiver.done():
                 data = self.last_data
-            except websockets.ConnectionClosed:
-                break
-            except Exception as e:
-                print(f"Game loop error: {e}")
-                break
             
-            # Update victory state from server
-            game_stats = data.get('game_stats', {})
-            self.victory = bool(game_stats.get('victory', False))
+                # Update victory state from server
+                game_stats = data.get('game_stats', {})
+                self.victory = bool(game_stats.get('victory', False))
             
-            # Clear screen
-            self.screen.fill(COLORS['background'])
+                # Clear screen
+                self.screen.fill(COLORS['background'])
             
-            # Draw game elements
-            maze = data.get('maze', [])
-            if maze:
-                self.draw_maze(self.screen, maze)
+                # Draw game elements
+                if self.maze:
+                    self.draw_maze(self.screen, self.maze)
             
-            # Draw players
-            players = data.get('players', {})
-            for player_id, player_data in players.items():
-                is_current = str(player_id) == str(self.current_player_id)
-                self.draw_player(self.screen, player_data, player_id, is_current)
+                # Draw players
+                players = data.get('players', {})
+                for player_id, player_data in players.items():
+                    is_current = str(player_id) == str(self.current_player_id)
+                    self.draw_player(self.screen, player_data, player_id, is_current)
             
-            # Draw ghosts
-            ghosts = data.get('ghosts', [])
-            # Determine frightened state if any player has power
-            players = data.get('players', {})
-            frightened = any(p.get('power', 0) > 0 for p in players.values())
-            # Track previous positions to infer velocity for eyes
-            if not hasattr(self, 'prev_ghost_positions') or len(self.prev_ghost_positions) != len(ghosts):
-                self.prev_ghost_positions = [(g.get('x', 0), g.get('y', 0)) for g in ghosts]
-            new_positions = []
-            for idx, ghost_data in enumerate(ghosts):
-                gx, gy = ghost_data.get('x', 0), ghost_data.get('y', 0)
-                pgx, pgy = self.prev_ghost_positions[idx] if idx < len(self.prev_ghost_positions) else (gx, gy)
-                vx, vy = (gx - pgx, gy - pgy)
-                self.draw_ghost(self.screen, ghost_data, frightened=frightened, velocity=(vx, vy))
-                new_positions.append((gx, gy))
-            self.prev_ghost_positions = new_positions
+                # Draw ghosts
+                ghosts = data.get('ghosts', [])
+                # Determine frightened state if any player has power
+                players = data.get('players', {})
+                frightened = any(p.get('power', 0) > 0 for p in players.values())
+                # Track previous positions to infer velocity for eyes
+                if not hasattr(self, 'prev_ghost_positions') or len(self.prev_ghost_positions) != len(ghosts):
+                    self.prev_ghost_positions = [(g.get('x', 0), g.get('y', 0)) for g in ghosts]
+                # Frames render faster than the server ticks; only a new frame moves the eyes
+                if data is not rendered or len(getattr(self, 'ghost_velocities', ())) != len(ghosts):
+                    self.ghost_velocities = []
+                    new_positions = []
+                    for idx, ghost_data in enumerate(ghosts):
+                        gx, gy = ghost_data.get('x', 0), ghost_data.get('y', 0)
+                        pgx, pgy = self.prev_ghost_positions[idx] if idx < len(self.prev_ghost_positions) else (gx, gy)
+                        self.ghost_velocities.append((gx - pgx, gy - pgy))
+                        new_positions.append((gx, gy))
+                    self.prev_ghost_positions = new_positions
+                for ghost_data, velocity in zip(ghosts, self.ghost_velocities):
+                    self.draw_ghost(self.screen, ghost_data, frightened=frightened, velocity=velocity)
             
-            # Draw UI
-            self.draw_ui(self.screen, data)
+                # Draw UI
+                self.draw_ui(self.screen, data)
             
-            # Draw victory overlay or death overlay
-            if self.victory:
-                self.draw_victory_menu(self.screen, data)
-            else:
-                current_player = players.get(self.current_player_id)
-                if current_player:
-                    self.draw_death_overlay(self.screen, current_player)
+                # Draw victory overlay or death overlay
+                if self.victory:
+                    self.draw_victory_menu(self.screen, data)
+                else:
+                    current_player = players.get(self.current_player_id)
+                    if current_player:
+                        self.draw_death_overlay(self.screen, current_player)
             
-            # Update display
-            pygame.display.flip()
-            self.clock.tick(60)
+                # Update display
+                pygame.display.flip()
+                rendered = data
+                self.clock.tick(60)
+                # Let the receiver run between frames
+                await asyncio.sleep(0)
+        finally:
+            receiver.cancel()
+            try:
+                await receiver
+            except asyncio.CancelledError:
+                pass
 
     def _gen_token(self, length=6):
         alpha = string.ascii_uppercase + string.digits
@@ -682,6 +715,7 @@ class SimpleGameClient:
                     else:
                         # Not a control message; stash as last_data for game loop
                         self.last_data = data0
+                        self.apply_maze_update(data0)
                 except Exception:
                     pass
                 
@@ -730,6 +764,7 @@ class SimpleGameClient:
                                 print(f"Assigned to room: {self.room_id}")
                             else:
                                 self.last_data = data0
+                                self.apply_maze_update(data0)
                         except Exception:
                             pass
                         input_task = asyncio.create_task(self.handle_input(websocket))
@@ -1,12 +1,43 @@
 # server/game_room.py
 import asyncio
-import copy
+import itertools
 import random
-import math
 import json
 import time
-from collections import deque
+from collections import OrderedDict, deque
 import websockets
+from websockets.protocol import State
+from .protocol import decode, encode_bytes
+
+
+class Ghost:
+    """A single ghost's movement and AI state"""
+
+    __slots__ = (
+        "x", "y", "target_x", "target_y", "dx", "dy", "behavior", "color",
+        "mode_timer", "home_x", "home_y", "last_positions", "last_grid",
+        "last_choice_tick", "behavior_change_timer", "current_behavior",
+        "prev_tile", "scatter_x", "scatter_y", "target_fn",
+    )
+
+    def __init__(self, x, y, behavior, color):
+        self.x = float(x)
+        self.y = float(y)
+        self.target_x = float(x)
+        self.target_y = float(y)
+        self.dx = 0
+        self.dy = 0
+        self.behavior = behavior
+        self.color = color
+        self.mode_timer = 0
+        self.home_x = x
+        self.home_y = y
+        self.last_positions = deque(maxlen=8)
+        self.last_grid = deque(maxlen=6)
+        self.last_choice_tick = 0
+        self.behavior_change_timer = 0
+        self.current_behavior = behavior
+        self.prev_tile = None
 
 
 class GameRoom:
@@ -23,8 +54,24 @@ class GameRoom:
     PLAYER_RADIUS = 15
     GHOST_RADIUS = 15
     PELLET_RADIUS = 4
+    TICK_INTERVAL = 0.05  # 20 FPS
     POWER_TIME = 200
+    COLLISION_DIST_SQ = 0.8 ** 2  # player/ghost contact distance, squared
     GRID_SNAP_THRESHOLD = 0.5
+    WALL_STRIDE = COLS + 1  # wall bitmap row width, one spare column
+    SLOW_CLIENT_BUFFER = 64 * 1024  # bytes queued before frames are dropped
+    IDLE_HEARTBEAT_TICKS = 10  # broadcast at least every 10 ticks (~2 FPS) when idle
+    PATH_CACHE_SIZE = 1000  # memoized (start, target) ghost path steps per room
+
+    VALID_KEYS = frozenset({"UP", "DOWN", "LEFT", "RIGHT", "RESTART"})
+    DIRECTION_VECTORS = {"UP": (0, -1), "DOWN": (0, 1), "LEFT": (-1, 0), "RIGHT": (1, 0)}
+    # Chase-mode targeting per ghost color (anything else behaves like Clyde)
+    GHOST_TARGETS = {
+        "red": "_target_blinky",
+        "purple": "_target_pinky",
+        "green": "_target_inky",
+        "orange": "_target_clyde",
+    }
 
     # Original maze template for resetting
     ORIGINAL_MAZE = [
@@ -47,16 +94,23 @@ class GameRoom:
 
     def __init__(self, room_id):
         self.room_id = room_id
-        self.players = {}  # websocket -> player data
+        self.players = {}  # player_id -> player data
+        # Small sequential player ids, assigned on join (websocket -> player_id)
+        self.player_ids = {}
+        self._next_player_id = itertools.count(1)
         self.clients = set()
         # Deterministic per-room maze seed so everyone in the room sees the same grid
         self._maze_seed = int(abs(hash(room_id))) & 0xFFFFFFFF
-        self.maze = self._generate_maze(self._maze_seed)
+        self._build_maze()
+        self._reset_maze()
         # Track tile visit counts for exploration bias (helps ghosts roam the grid)
         self.visit_counts = [
             [0 for _ in range(self.COLS)] for _ in range(self.ROWS)]
+        # Room-local RNG for ghost AI; hot paths bind its methods to locals
+        self._rng = random.Random()
         self.ghosts = self._initialize_ghosts()
         self.game_tick = 0
+        self._last_state = None  # last broadcast state, minus game_tick
         self.running = False
         self.game_loop_task = None
         self.created_at = time.time()
@@ -66,6 +120,50 @@ class GameRoom:
         self.CHASE_STEPS = 7 * 20     # ~7 seconds at 20 FPS
         self.SCATTER_STEPS = 5 * 20   # ~5 seconds at 20 FPS
 
+    def _build_maze(self):
+        """Generate this room's maze once, plus the lookup tables derived from its walls"""
+        # Flat row-major grid: cell (x, y) lives at maze[y * COLS + x]. The seed
+        # is fixed per room, so resets copy this template instead of re-running
+        # the generator.
+        self._maze_template = bytes(
+            cell for row in self._generate_maze(self._maze_seed) for cell in row)
+        self._template_pellets = self._maze_template.count(2) + self._maze_template.count(3)
+        # Wall bitmap for can_move: bit (y * WALL_STRIDE + x) is set for walls.
+        # The spare column past COLS, and every row past ROWS, read as open,
+        # matching can_move's old out-of-bounds checks.
+        stride = self.WALL_STRIDE
+        self._wall_bits = sum(
+            1 << ((i // self.COLS) * stride + i % self.COLS)
+            for i, cell in enumerate(self._maze_template) if cell == 1)
+        # Open directions per tile; walls never change during a game (pellets are
+        # cleared to 0), so this is built once per room
+        self.maze = self._maze_template
+        self._dir_cache = [
+            self._compute_valid_directions(x, y)
+            for y in range(self.ROWS) for x in range(self.COLS)]
+        # The same table as flat neighbor indices, so the BFS works on ints
+        cols = self.COLS
+        self._adjacency = [
+            tuple(i + dy * cols + dx for dx, dy in dirs)
+            for i, dirs in enumerate(self._dir_cache)]
+        # Shortest-path first steps depend only on the walls, so they stay
+        # valid for the room's lifetime (LRU over (sx, sy, tx, ty))
+        self._path_cache = OrderedDict()
+
+    def _reset_maze(self):
+        """Restore this room's freshly generated maze and reset the live pellet counter"""
+        self.maze = bytearray(self._maze_template)
+        self.pellet_count = self._template_pellets
+        # Per-tick maze diff as (y * COLS + x, value) pairs; clients that need the
+        # whole grid (new joiners, dropped frames, maze reset) get it in full
+        self._maze_changes = []
+        self._full_maze_pending = set(self.clients)
+
+    def _maze_rows(self):
+        """Return the maze as a list of rows, the layout clients render from"""
+        cols = self.COLS
+        return [list(self.maze[i:i + cols]) for i in range(0, len(self.maze), cols)]
+
     def _generate_maze(self, seed: int):
         """Generate a random, solvable maze for this room using a deterministic seed.
         - Walls = 1, empty path = 0, pellets = 2, power pellets = 3
@@ -116,46 +214,11 @@ class GameRoom:
 
     def _initialize_ghosts(self):
         """Initialize ghosts for this room (ensure walkable spawns and initial direction)."""
-        class Ghost:
-            def __init__(self, x, y, behavior, color):
-                self.x = float(x)
-                self.y = float(y)
-                self.target_x = float(x)
-                self.target_y = float(y)
-                self.dx = 0
-                self.dy = 0
-                self.behavior = behavior
-                self.color = color
-                self.mode_timer = 0
-                self.home_x = x
-                self.home_y = y
-                self.path = deque()
-                self.stuck_counter = 0
-                self.last_positions = deque(maxlen=8)
-                self.last_grid = deque(maxlen=6)
-                self.last_choice_tick = 0
-                self.behavior_change_timer = 0
-                self.current_behavior = behavior
-                self.randomness_factor = random.uniform(0.3, 0.8)
-                self.change_interval = random.randint(
-                    10, 40)  # more frequent direction changes
-                self.prev_tile = None
-
-            def snap_to_grid(self):
-                grid_x = round(self.x)
-                grid_y = round(self.y)
-
-                if abs(self.x - grid_x) < GameRoom.GRID_SNAP_THRESHOLD:
-                    self.x = float(grid_x)
-                if abs(self.y - grid_y) < GameRoom.GRID_SNAP_THRESHOLD:
-                    self.y = float(grid_y)
-
-        import random
         ghosts = [
-            Ghost(9 + random.uniform(-0.2, 0.2), 7 + random.uniform(-0.2, 0.2), "aggressive", "red"),
-            Ghost(8 + random.uniform(-0.2, 0.2), 9 + random.uniform(-0.2, 0.2), "patrol", "orange"),
-            Ghost(10 + random.uniform(-0.2, 0.2), 9 + random.uniform(-0.2, 0.2), "ambush", "purple"),
-            Ghost(9 + random.uniform(-0.2, 0.2), 8 + random.uniform(-0.2, 0.2), "random", "green")
+            Ghost(9 + self._rng.uniform(-0.2, 0.2), 7 + self._rng.uniform(-0.2, 0.2), "aggressive", "red"),
+            Ghost(8 + self._rng.uniform(-0.2, 0.2), 9 + self._rng.uniform(-0.2, 0.2), "patrol", "orange"),
+            Ghost(10 + self._rng.uniform(-0.2, 0.2), 9 + self._rng.uniform(-0.2, 0.2), "ambush", "purple"),
+            Ghost(9 + self._rng.uniform(-0.2, 0.2), 8 + self._rng.uniform(-0.2, 0.2), "random", "green")
         ]
 
         # Initialize ghosts with proper starting directions and scatter corners
@@ -173,7 +236,7 @@ class GameRoom:
             # If initial direction is blocked, pick a valid one
             valids = self._get_valid_directions_simple(int(round(ghost.x)), int(round(ghost.y)))
             if valids:
-                ghost.dx, ghost.dy = random.choice(valids)
+                ghost.dx, ghost.dy = self._rng.choice(valids)
             ghost.mode_timer = i * 10  # Stagger behavior updates
             # Scatter targets (corners)
             top_left = (1, 1)
@@ -188,6 +251,7 @@ class GameRoom:
                 ghost.scatter_x, ghost.scatter_y = bottom_right
             else:  # orange -> Clyde
                 ghost.scatter_x, ghost.scatter_y = bottom_left
+            ghost.target_fn = getattr(self, self.GHOST_TARGETS.get(ghost.color, "_target_clyde"))
 
         return ghosts
 
@@ -205,7 +269,9 @@ class GameRoom:
             return False
 
         self.clients.add(websocket)
-        player_id = id(websocket)
+        self._full_maze_pending.add(websocket)
+        player_id = next(self._next_player_id)
+        self.player_ids[websocket] = player_id
 
         # Better starting positions for 2 players
         start_positions = [(1.0, 1.0), (17.0, 13.0)]
@@ -224,7 +290,8 @@ class GameRoom:
             "direction": None,
             "name": f"Player{len(self.players)}",
             "moving": False,
-            "last_move_time": 0
+            "last_move_time": 0,
+            "pending_msgs": []
         }
 
         # Start game loop if this is the first player
@@ -236,11 +303,12 @@ class GameRoom:
 
     async def remove_player(self, websocket):
         """Remove a player from this room"""
-        player_id = id(websocket)
+        player_id = self.player_ids.pop(websocket, None)
         if player_id in self.players:
             del self.players[player_id]
 
         self.clients.discard(websocket)
+        self._full_maze_pending.discard(websocket)
 
         # Stop game loop if no players left
         if self.is_empty() and self.running:
@@ -250,59 +318,69 @@ class GameRoom:
 
     async def handle_input(self, websocket, message):
         """Handle input from a player in this room"""
-        player_id = id(websocket)
-        if player_id not in self.players:
+        player_id = self.player_ids.get(websocket)
+        player = self.players.get(player_id)
+        if player is None:
+            return
+        # Inputs are always JSON objects; skip decoding anything else
+        if not message or message[:1] not in ("{", b"{"):
             return
 
         try:
-            data = json.loads(message)
+            data = decode(message)
             key = data.get("key")
             action = data.get("action", "press")
 
-            if key in {"UP", "DOWN", "LEFT", "RIGHT", "RESTART"}:
+            if key in self.VALID_KEYS:
                 if action == "press":
                     if key == "RESTART":
                         # Allow restart when player is dead OR after victory
-                        if self.players[player_id]["dead"]:
+                        if player["dead"]:
                             await self._reset_player(player_id)
                         elif self._check_victory():
                             await self._reset_room()
                     else:
-                        self.players[player_id]["keys"].add(key)
+                        player["keys"].add(key)
                 else:
-                    self.players[player_id]["keys"].discard(key)
+                    player["keys"].discard(key)
         except json.JSONDecodeError:
             pass
 
+    def queue_event(self, websocket, event):
+        """Queue a message for one player; it rides along with the next state frame"""
+        player = self.players.get(self.player_ids.get(websocket))
+        if player is not None:
+            player["pending_msgs"].append(event)
+
     def can_move(self, x, y):
-        """Enhanced movement validation"""
+        """Enhanced movement validation (bit tests against the wall bitmap)"""
         if not (0.3 <= x < self.COLS - 0.3 and 0.3 <= y < self.ROWS - 0.3):
             return False
 
-        center_x = int(round(x))
-        center_y = int(round(y))
-
-        if 0 <= center_x < self.COLS and 0 <= center_y < self.ROWS:
-            if self.maze[center_y][center_x] == 1:
-                return False
-
-        if abs(x - round(x)) > 0.3 or abs(y - round(y)) > 0.3:
-            corners = [
-                (int(x), int(y)),
-                (int(x + 0.4), int(y)),
-                (int(x), int(y + 0.4)),
-                (int(x + 0.4), int(y + 0.4))
-            ]
+        walls = self._wall_bits
+        stride = self.WALL_STRIDE
+        # round() (halves to even), not int(v + 0.5): the two differ at exact .5
+        center_x = round(x)
+        center_y = round(y)
+        if (walls >> (center_y * stride + center_x)) & 1:
+            return False
 
-            for cx, cy in corners:
-                if 0 <= cx < self.COLS and 0 <= cy < self.ROWS:
-                    if self.maze[cy][cx] == 1:
-                        return False
+        if abs(x - center_x) > 0.3 or abs(y - center_y) > 0.3:
+            # Off-center: OR the four corner tiles' wall bits together
+            x0, x1 = int(x), int(x + 0.4)
+            row0, row1 = int(y) * stride, int(y + 0.4) * stride
+            return not ((walls >> (row0 + x0)) | (walls >> (row0 + x1))
+                        | (walls >> (row1 + x0)) | (walls >> (row1 + x1))) & 1
 
         return True
 
     def _update_players(self):
         """Update player positions and handle collisions"""
+        # Hoist per-tick invariants out of the player loop
+        rows, cols = self.ROWS, self.COLS
+        speed = self.PLAYER_SPEED
+        maze = self.maze
+        can_move = self.can_move
         for player in self.players.values():
             if player["dead"]:
                 continue
@@ -311,50 +389,57 @@ class GameRoom:
             target_x, target_y = current_x, current_y
 
             # Determine target based on input
-            if "UP" in player["keys"]:
-                target_y = current_y - self.PLAYER_SPEED
+            keys = player["keys"]
+            if "UP" in keys:
+                target_y = current_y - speed
                 player["direction"] = "UP"
-            elif "DOWN" in player["keys"]:
-                target_y = current_y + self.PLAYER_SPEED
+            elif "DOWN" in keys:
+                target_y = current_y + speed
                 player["direction"] = "DOWN"
-            elif "LEFT" in player["keys"]:
-                target_x = current_x - self.PLAYER_SPEED
+            elif "LEFT" in keys:
+                target_x = current_x - speed
                 player["direction"] = "LEFT"
-            elif "RIGHT" in player["keys"]:
-                target_x = current_x + self.PLAYER_SPEED
+            elif "RIGHT" in keys:
+                target_x = current_x + speed
                 player["direction"] = "RIGHT"
 
             # Apply movement if valid
             if target_x != current_x or target_y != current_y:
-                new_x = max(0.4, min(self.COLS - 0.4, target_x))
-                new_y = max(0.4, min(self.ROWS - 0.4, target_y))
+                new_x = max(0.4, min(cols - 0.4, target_x))
+                new_y = max(0.4, min(rows - 0.4, target_y))
 
-                if self.can_move(new_x, new_y):
+                if can_move(new_x, new_y):
                     player["x"], player["y"] = new_x, new_y
 
-            # Snap to grid when very close (for pellet collection)
-            snap_threshold = 0.15
-            if abs(player["x"] - round(player["x"])) < snap_threshold:
-                player["x"] = float(round(player["x"]))
-            if abs(player["y"] - round(player["y"])) < snap_threshold:
-                player["y"] = float(round(player["y"]))
+            # Snap to grid when very close (for pellet collection). Snapping
+            # doesn't change the nearest tile, so gx/gy serve the pellet check too
+            x, y = player["x"], player["y"]
+            gx, gy = round(x), round(y)
+            if abs(x - gx) < 0.15:
+                player["x"] = float(gx)
+            if abs(y - gy) < 0.15:
+                player["y"] = float(gy)
 
             # Pellet collection
-            gx, gy = int(round(player["x"])), int(round(player["y"]))
-            if 0 <= gy < self.ROWS and 0 <= gx < self.COLS:
-                cell = self.maze[gy][gx]
+            if 0 <= gy < rows and 0 <= gx < cols:
+                idx = gy * cols + gx
+                cell = maze[idx]
                 if cell == 2:
-                    self.maze[gy][gx] = 0
+                    maze[idx] = 0
+                    self.pellet_count -= 1
+                    self._maze_changes.append((idx, 0))
                     player["score"] += 10
                 elif cell == 3:
-                    self.maze[gy][gx] = 0
+                    maze[idx] = 0
+                    self.pellet_count -= 1
+                    self._maze_changes.append((idx, 0))
                     player["score"] += 50
                     player["power"] = self.POWER_TIME
 
     def _update_ghosts(self):
         """Tile-aware ghost movement with classic chase/scatter and frightened behavior"""
         # Determine if frightened mode is active (any player powered)
-        frightened = any(p.get("power", 0) > 0 for p in self.players.values())
+        frightened = any(p["power"] > 0 for p in self.players.values())
 
         # Update global mode timer when not frightened
         if not frightened:
@@ -366,144 +451,132 @@ class GameRoom:
                 self.mode = "scatter"
                 self.mode_timer = 0
 
+        rng_choice = self._rng.choice
+        rows, cols = self.ROWS, self.COLS
+        maze = self.maze
+        can_move = self.can_move
+        choose = self._choose_ghost_direction
+        valid_dirs = self._get_valid_directions_simple
+        visit_counts = self.visit_counts
+        # Player filter is loop-invariant: flatten the alive players to
+        # (x, y, direction) tuples once per tick for all ghosts
+        alive_players = [
+            (p["x"], p["y"], p.get("direction"))
+            for p in self.players.values() if not p["dead"]]
+
+        # Movement speed depends only on the global mode, so it is shared by all ghosts
+        speed = self.GHOST_SPEED
+        if frightened:
+            speed = max(0.15, self.GHOST_SPEED * 0.85)
+        elif self.mode == "chase":
+            speed = min(0.28, self.GHOST_SPEED * 1.1)
+
         for ghost in self.ghosts:
             # Choose direction at tile centers or when blocked
-            if self._at_tile_center(ghost.x, ghost.y):
+            # Tile-center test inlined: coordinates are non-negative, so
+            # int(v + 0.5) is the nearest tile index
+            x, y = ghost.x, ghost.y
+            vx, vy = int(x + 0.5), int(y + 0.5)
+            if -0.1 < x - vx < 0.1 and -0.1 < y - vy < 0.1:
                 # Increment visit count at current tile
-                vx, vy = int(round(ghost.x)), int(round(ghost.y))
-                if 0 <= vy < self.ROWS and 0 <= vx < self.COLS:
-                    self.visit_counts[vy][vx] = min(
-                        self.visit_counts[vy][vx] + 1, 1_000_000)
-                self._choose_ghost_direction(ghost, frightened)
+                if 0 <= vy < rows and 0 <= vx < cols:
+                    visit_counts[vy][vx] = min(
+                        visit_counts[vy][vx] + 1, 1_000_000)
+                choose(ghost, frightened, alive_players)
                 ghost.prev_tile = (vx, vy)
 
             # Move along current direction with mode-based speed tuning
-            speed = self.GHOST_SPEED
-            if frightened:
-                speed = max(0.15, self.GHOST_SPEED * 0.85)
-            elif self.mode == "chase":
-                speed = min(0.28, self.GHOST_SPEED * 1.1)
             new_x = ghost.x + ghost.dx * speed
             new_y = ghost.y + ghost.dy * speed
 
             # Horizontal tunnel wrap if open
-            gy = int(round(ghost.y))
-            if 0 <= gy < self.ROWS:
-                left_open = self.maze[gy][0] == 0
-                right_open = self.maze[gy][self.COLS - 1] == 0
+            gy = round(ghost.y)
+            if 0 <= gy < rows:
+                row = gy * cols
+                left_open = maze[row] == 0
+                right_open = maze[row + cols - 1] == 0
                 if left_open and ghost.dx < 0 and new_x <= 0.4:
-                    new_x = self.COLS - 0.6
-                if right_open and ghost.dx > 0 and new_x >= self.COLS - 0.4:
+                    new_x = cols - 0.6
+                if right_open and ghost.dx > 0 and new_x >= cols - 0.4:
                     new_x = 0.6
 
             # If ghost has no direction (e.g., after respawn), choose one now
             if ghost.dx == 0 and ghost.dy == 0:
-                self._choose_ghost_direction(ghost, frightened, force=True)
+                choose(ghost, frightened, alive_players, force=True)
                 # Recompute tentative movement with picked direction
                 new_x = ghost.x + ghost.dx * speed
                 new_y = ghost.y + ghost.dy * speed
 
             # Apply movement if valid, else force a new direction (allow reverse as last resort)
-            if self.can_move(new_x, new_y):
+            if can_move(new_x, new_y):
                 ghost.x, ghost.y = new_x, new_y
             else:
                 # pick new direction immediately
-                self._choose_ghost_direction(ghost, frightened, force=True)
+                choose(ghost, frightened, alive_players, force=True)
                 new_x2 = ghost.x + ghost.dx * speed
                 new_y2 = ghost.y + ghost.dy * speed
-                if self.can_move(new_x2, new_y2):
+                if can_move(new_x2, new_y2):
                     ghost.x, ghost.y = new_x2, new_y2
                 else:
                     # Strong fallback: snap to tile center and choose any valid non-wall direction
-                    cx2, cy2 = int(round(ghost.x)), int(round(ghost.y))
+                    cx2, cy2 = round(ghost.x), round(ghost.y)
                     ghost.x, ghost.y = float(cx2), float(cy2)
-                    valids = self._get_valid_directions_simple(cx2, cy2)
+                    valids = valid_dirs(cx2, cy2)
                     if valids:
-                        choice = random.choice(valids)
+                        choice = rng_choice(valids)
                         ghost.dx, ghost.dy = choice
                         new_x3 = ghost.x + ghost.dx * speed
                         new_y3 = ghost.y + ghost.dy * speed
-                        if self.can_move(new_x3, new_y3):
+                        if can_move(new_x3, new_y3):
                             ghost.x, ghost.y = new_x3, new_y3
 
             # Track grid transitions to fight oscillations and stuck
-            gx2, gy2 = int(round(ghost.x)), int(round(ghost.y))
+            # round() of a float already returns an int; reused by the anti-stuck check
+            gx2, gy2 = round(ghost.x), round(ghost.y)
             ghost.last_grid.append((gx2, gy2))
 
             # Anti-stuck: if ghost barely moved for a while, randomize direction
             ghost.last_positions.append((round(ghost.x,2), round(ghost.y,2)))
             if len(ghost.last_positions) >= ghost.last_positions.maxlen:
                 if len(set(ghost.last_positions)) <= 2:  # almost stationary
-                    cx3, cy3 = int(round(ghost.x)), int(round(ghost.y))
-                    valids = self._get_valid_directions_simple(cx3, cy3)
+                    cx3, cy3 = gx2, gy2
+                    valids = valid_dirs(cx3, cy3)
                     if valids:
-                        choice = random.choice(valids)
+                        choice = rng_choice(valids)
                         if choice == (-ghost.dx, -ghost.dy) and len(valids) > 1:
-                            choice = random.choice([d for d in valids if d != (-ghost.dx, -ghost.dy)])
+                            choice = rng_choice([d for d in valids if d != (-ghost.dx, -ghost.dy)])
                         ghost.dx, ghost.dy = choice
                         # Nudge movement after choosing to break inertia
                         nux = float(cx3) + ghost.dx * speed
                         nuy = float(cy3) + ghost.dy * speed
-                        if self.can_move(nux, nuy):
+                        if can_move(nux, nuy):
                             ghost.x, ghost.y = nux, nuy
                         ghost.last_positions.clear()
 
             # Periodic re-evaluation: if going straight too long in chase, try a turn at intersections
-            if self.mode == "chase" and (self.game_tick - getattr(ghost, 'last_choice_tick', 0)) > 40:
-                if self._at_tile_center(ghost.x, ghost.y):
-                    self._choose_ghost_direction(ghost, frightened, force=False)
-
-    def _update_ghost_behavior(self, ghost):
-        """Deprecated: direction choice handled in _choose_ghost_direction"""
-        return
-
-    def _get_valid_directions(self, x, y):
-        """Get valid movement directions (legacy)"""
-        directions = []
-        moves = [(-1, 0, "LEFT"), (1, 0, "RIGHT"),
-                 (0, -1, "UP"), (0, 1, "DOWN")]
-
-        for dx, dy, direction in moves:
-            new_x = x + dx * self.GHOST_SPEED * 2
-            new_y = y + dy * self.GHOST_SPEED * 2
-            if self.can_move(new_x, new_y):
-                directions.append((dx, dy, direction))
-
-        return directions
-
-    def _get_grid_directions(self, grid_x, grid_y):
-        """Get valid grid-based directions for ghosts"""
-        directions = []
-        moves = [(-1, 0, "LEFT"), (1, 0, "RIGHT"),
-                 (0, -1, "UP"), (0, 1, "DOWN")]
-
-        for dx, dy, direction in moves:
-            new_x = grid_x + dx
-            new_y = grid_y + dy
-            if self.can_move(new_x, new_y):
-                directions.append((dx, dy, direction))
-
-        return directions
+            if self.mode == "chase" and (self.game_tick - ghost.last_choice_tick) > 40:
+                x, y = ghost.x, ghost.y
+                if -0.1 < x - int(x + 0.5) < 0.1 and -0.1 < y - int(y + 0.5) < 0.1:
+                    choose(ghost, frightened, alive_players, force=False)
 
     def _get_valid_directions_simple(self, x, y):
         """Get valid movement directions for ghosts (immediate tile check)"""
+        cx, cy = round(x), round(y)
+        if 0 <= cx < self.COLS and 0 <= cy < self.ROWS:
+            return self._dir_cache[cy * self.COLS + cx]
+        return self._compute_valid_directions(cx, cy)
+
+    def _compute_valid_directions(self, cx, cy):
         directions = []
         moves = [(-1, 0), (1, 0), (0, -1), (0, 1)]  # LEFT, RIGHT, UP, DOWN
-        cx, cy = int(round(x)), int(round(y))
         for dx, dy in moves:
             nx, ny = cx + dx, cy + dy
-            if 0 <= nx < self.COLS and 0 <= ny < self.ROWS and self.maze[ny][nx] != 1:
+            if 0 <= nx < self.COLS and 0 <= ny < self.ROWS and self.maze[ny * self.COLS + nx] != 1:
                 directions.append((dx, dy))
-        return directions
+        return tuple(directions)
 
     def _is_walkable_tile(self, x: int, y: int) -> bool:
-        return 0 <= x < self.COLS and 0 <= y < self.ROWS and self.maze[y][x] != 1
-
-    def _neighbors(self, x: int, y: int):
-        for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-            nx, ny = x + dx, y + dy
-            if self._is_walkable_tile(nx, ny):
-                yield nx, ny, dx, dy
+        return 0 <= x < self.COLS and 0 <= y < self.ROWS and self.maze[y * self.COLS + x] != 1
 
     def _nearest_walkable(self, tx: int, ty: int, max_radius: int = 5):
         """Find the nearest walkable tile around (tx, ty) within a small radius."""
@@ -520,7 +593,20 @@ class GameRoom:
     def _bfs_next_step(self, sx: int, sy: int, tx: int, ty: int, node_limit: int = 1200):
         """Return the first step (dx, dy) on a shortest path from (sx, sy) to (tx, ty) using BFS.
         If no path, return None. Limits explored nodes to keep it cheap.
+        Results are memoized per room, since the walls never change.
         """
+        cache = self._path_cache
+        key = (sx, sy, tx, ty)
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        step = self._bfs_search(sx, sy, tx, ty, node_limit)
+        cache[key] = step
+        if len(cache) > self.PATH_CACHE_SIZE:
+            cache.popitem(last=False)
+        return step
+
+    def _bfs_search(self, sx: int, sy: int, tx: int, ty: int, node_limit: int):
         if not self._is_walkable_tile(sx, sy):
             return None
         if not self._is_walkable_tile(tx, ty):
@@ -528,103 +614,95 @@ class GameRoom:
             if not nearest:
                 return None
             tx, ty = nearest
-        start = (sx, sy)
-        target = (tx, ty)
+        # Flat-index BFS over the precomputed adjacency table; parents doubles
+        # as the visited set (-1 = unseen)
+        cols = self.COLS
+        start = sy * cols + sx
+        target = ty * cols + tx
         if start == target:
             return None
+        adjacency = self._adjacency
+        parents = [-1] * len(adjacency)
+        parents[start] = start
         q = deque([start])
-        parents = {start: None}
         explored = 0
         while q and explored < node_limit:
-            x0, y0 = q.popleft()
+            cur = q.popleft()
             explored += 1
-            if (x0, y0) == target:
+            if cur == target:
                 break
-            for nx, ny, _, _ in self._neighbors(x0, y0):
-                if (nx, ny) not in parents:
-                    parents[(nx, ny)] = (x0, y0)
-                    q.append((nx, ny))
-        if target not in parents:
+            for nxt in adjacency[cur]:
+                if parents[nxt] < 0:
+                    parents[nxt] = cur
+                    q.append(nxt)
+        if parents[target] < 0:
             return None
         # backtrack to get next step from start
         cur = target
-        while parents[cur] is not None and parents[cur] != start:
+        while parents[cur] != start:
             cur = parents[cur]
-        nx, ny = cur
-        return (nx - sx, ny - sy)
+        return (cur % cols - sx, cur // cols - sy)
 
-    def _at_tile_center(self, x, y):
-        return abs(x - round(x)) < 0.1 and abs(y - round(y)) < 0.1
-
-    def _ghost_target_tile(self, ghost, frightened: bool):
+    def _ghost_target_tile(self, ghost, frightened: bool, alive_players):
         # Compute target tile based on mode and ghost type
-        alive_players = [p for p in self.players.values() if not p["dead"]]
         if not alive_players:
             return (ghost.scatter_x, ghost.scatter_y)
+        if self.mode == "scatter" and not frightened:
+            return (ghost.scatter_x, ghost.scatter_y)
         # choose primary target player (closest)
-        closest = min(alive_players, key=lambda p: self._distance(
-            ghost.x, ghost.y, p["x"], p["y"]))
-        px, py = closest["x"], closest["y"]
-        pdir = closest.get("direction")
+        gx, gy = ghost.x, ghost.y
+        px, py, pdir = min(
+            alive_players, key=lambda p: (p[0] - gx) * (p[0] - gx) + (p[1] - gy) * (p[1] - gy))
         # frightened: run to scatter target opposite of player
         if frightened:
             # Flee away from nearest player
             fx = ghost.x + (ghost.x - px) * 2
             fy = ghost.y + (ghost.y - py) * 2
             return (int(round(fx)), int(round(fy)))
-        # Scatter mode
-        if self.mode == "scatter":
-            return (ghost.scatter_x, ghost.scatter_y)
-        # Chase mode behaviors
-        if ghost.color == "red":  # Blinky - direct chase
+        # Chase mode behaviors (bound per ghost in _initialize_ghosts)
+        return ghost.target_fn(ghost, px, py, pdir)
+
+    def _target_blinky(self, ghost, px, py, pdir):
+        """Blinky - direct chase"""
+        return (int(round(px)), int(round(py)))
+
+    def _target_pinky(self, ghost, px, py, pdir):
+        """Pinky - aim 4 tiles ahead of player"""
+        dx, dy = self.DIRECTION_VECTORS.get(pdir, (0, 0))
+        return (int(round(px + 4*dx)), int(round(py + 4*dy)))
+
+    def _target_inky(self, ghost, px, py, pdir):
+        """Inky - use vector from red to two tiles ahead of player"""
+        red = next((g for g in self.ghosts if g.color == 'red'), None)
+        if red is None:
             return (int(round(px)), int(round(py)))
-        elif ghost.color == "purple":  # Pinky - aim 4 tiles ahead of player
-            dx, dy = 0, 0
-            if pdir == "UP":
-                dx, dy = 0, -1
-            elif pdir == "DOWN":
-                dx, dy = 0, 1
-            elif pdir == "LEFT":
-                dx, dy = -1, 0
-            elif pdir == "RIGHT":
-                dx, dy = 1, 0
-            return (int(round(px + 4*dx)), int(round(py + 4*dy)))
-        elif ghost.color == "green":  # Inky - use vector from red to two tiles ahead of player
-            red = next((g for g in self.ghosts if getattr(
-                g, 'color', '') == 'red'), None)
-            if red is None:
-                return (int(round(px)), int(round(py)))
-            # point two tiles ahead of player
-            ax, ay = px, py
-            if pdir == "UP":
-                ay -= 2
-            elif pdir == "DOWN":
-                ay += 2
-            elif pdir == "LEFT":
-                ax -= 2
-            elif pdir == "RIGHT":
-                ax += 2
-            vx = (ax - red.x) * 2
-            vy = (ay - red.y) * 2
-            return (int(round(red.x + vx)), int(round(red.y + vy)))
-        else:  # orange - Clyde: chase when far, scatter when near
-            dist = self._distance(ghost.x, ghost.y, px, py)
-            if dist > 8:
-                return (int(round(px)), int(round(py)))
-            return (ghost.scatter_x, ghost.scatter_y)
+        # point two tiles ahead of player
+        dx, dy = self.DIRECTION_VECTORS.get(pdir, (0, 0))
+        ax, ay = px + 2*dx, py + 2*dy
+        vx = (ax - red.x) * 2
+        vy = (ay - red.y) * 2
+        return (int(round(red.x + vx)), int(round(red.y + vy)))
+
+    def _target_clyde(self, ghost, px, py, pdir):
+        """Clyde - chase when far, scatter when near"""
+        if self._dist2(ghost.x, ghost.y, px, py) > 8 * 8:
+            return (int(round(px)), int(round(py)))
+        return (ghost.scatter_x, ghost.scatter_y)
 
-    def _choose_ghost_direction(self, ghost, frightened: bool, force: bool = False):
-        cx, cy = int(round(ghost.x)), int(round(ghost.y))
+    def _choose_ghost_direction(self, ghost, frightened: bool, alive_players, force: bool = False):
+        cx, cy = round(ghost.x), round(ghost.y)
         valid_dirs = self._get_valid_directions_simple(cx, cy)
         if not valid_dirs:
             return
+        rng = self._rng
         reverse = (-ghost.dx, -ghost.dy)
-        # Prefer not to reverse unless forced
+        # Prefer not to reverse; reversing is only a candidate at dead ends,
+        # so no branch below needs to re-check for it
         non_reverse = [d for d in valid_dirs if d != reverse]
         candidates = non_reverse or valid_dirs
 
         # Determine a target tile and plan via BFS
-        tx, ty = self._ghost_target_tile(ghost, frightened)
+        tx, ty = self._ghost_target_tile(ghost, frightened, alive_players)
         tx = int(max(0, min(self.COLS - 1, tx)))
         ty = int(max(0, min(self.ROWS - 1, ty)))
         step = self._bfs_next_step(cx, cy, tx, ty)
@@ -648,6 +726,7 @@ class GameRoom:
         if is_intersection or force:
             best_score = None
             best_dirs = []
+            uniform = rng.uniform
             for dx, dy in candidates:
                 nx, ny = cx + dx, cy + dy
                 vis = self.visit_counts[ny][nx] if 0 <= ny < self.ROWS and 0 <= nx < self.COLS else 0
@@ -658,30 +737,23 @@ class GameRoom:
                 # Penalty for oscillation
                 score += oscillation_penalty.get((dx, dy), 0)
                 # Mild randomness to diversify
-                score += random.uniform(0, 0.25)
+                score += uniform(0, 0.25)
                 if best_score is None or score < best_score:
                     best_score = score
                     best_dirs = [(dx, dy)]
                 elif abs(score - best_score) < 1e-6:
                     best_dirs.append((dx, dy))
-            choice = random.choice(best_dirs)
-            if not force and choice == reverse and len(candidates) > 1:
-                alt = [d for d in best_dirs if d != reverse] or [d for d in candidates if d != reverse]
-                choice = random.choice(alt)
-            ghost.dx, ghost.dy = choice
+            ghost.dx, ghost.dy = rng.choice(best_dirs)
             ghost.last_choice_tick = self.game_tick
             return
 
         # Add small randomness to avoid repetitive patterns when not at intersections
-        if random.random() < (0.10 if not frightened else 0.25):
-            choice = random.choice(candidates)
-            if not force and choice == reverse and len(candidates) > 1:
-                choice = random.choice([d for d in candidates if d != reverse])
-            ghost.dx, ghost.dy = choice
+        if rng.random() < (0.10 if not frightened else 0.25):
+            ghost.dx, ghost.dy = rng.choice(candidates)
             ghost.last_choice_tick = self.game_tick
             return
 
-        if step is not None and ((step in candidates) or force):
+        if step is not None and step in candidates:
             ghost.dx, ghost.dy = step
             ghost.last_choice_tick = self.game_tick
             return
@@ -689,26 +761,30 @@ class GameRoom:
         # Fallback: choose the direction that gets closer to target (ties random)
         best_choices = []
         best_dist = None
+        ox, oy = cx - tx, cy - ty
         for dx, dy in candidates:
-            nx, ny = cx + dx, cy + dy
-            dist = self._distance(nx, ny, tx, ty)
+            # Inline squared distance on integer tiles: exact, so ties compare with ==
+            ex, ey = ox + dx, oy + dy
+            dist = ex * ex + ey * ey
             if best_dist is None or dist < best_dist:
                 best_choices = [(dx, dy)]
                 best_dist = dist
-            elif abs(dist - best_dist) < 1e-6:
+            elif dist == best_dist:
                 best_choices.append((dx, dy))
-        if best_choices:
-            ghost.dx, ghost.dy = random.choice(best_choices)
-            ghost.last_choice_tick = self.game_tick
+        ghost.dx, ghost.dy = rng.choice(best_choices)
+        ghost.last_choice_tick = self.game_tick
 
-    def _distance(self, x1, y1, x2, y2):
-        """Calculate distance between two points"""
-        return math.sqrt((x2 - x1)**2 + (y2 - y1)**2)
+    @staticmethod
+    def _dist2(x1, y1, x2, y2):
+        """Squared distance between two points (only ever compared, so no sqrt)"""
+        dx = x2 - x1
+        dy = y2 - y1
+        return dx * dx + dy * dy
 
     async def _reset_room(self):
         """Reset the entire room after victory or on demand"""
-        # Reset maze and game tick (regenerate using the same seed for this room)
-        self.maze = self._generate_maze(self._maze_seed)
+        # Reset maze and game tick (restore this room's generated maze)
+        self._reset_maze()
         self.game_tick = 0
         self.mode = "scatter"
         self.mode_timer = 0
@@ -730,17 +806,20 @@ class GameRoom:
 
     def _check_player_death(self):
         """Check for player-ghost collisions"""
+        ghosts = self.ghosts
+        hit_dist_sq = self.COLLISION_DIST_SQ
         for player in self.players.values():
             if player["dead"]:
                 continue
 
             px, py = player["x"], player["y"]
-            power = player.get("power", 0)
+            power = player["power"]
 
-            for ghost in self.ghosts:
-                gx, gy = ghost.x, ghost.y
-
-                if self._distance(px, py, gx, gy) < 0.8:
+            for ghost in ghosts:
+                # Inline squared-distance test: no sqrt, no method call per pair
+                dx = ghost.x - px
+                dy = ghost.y - py
+                if dx * dx + dy * dy < hit_dist_sq:
                     if power > 0:
                         player["score"] += 200
                         # Reset ghost to home (nearest walkable) and clear direction; will pick next tick
@@ -752,7 +831,6 @@ class GameRoom:
                         else:
                             ghost.x, ghost.y = ghost.home_x, ghost.home_y
                         ghost.dx, ghost.dy = 0, 0
-                        ghost.path.clear()
                         ghost.mode_timer = 0
                         ghost.behavior_change_timer = 0
                         ghost.current_behavior = ghost.behavior
@@ -764,8 +842,7 @@ class GameRoom:
 
     def _check_victory(self):
         """Check for victory condition"""
-        total_pellets = sum(row.count(2) + row.count(3) for row in self.maze)
-        return total_pellets == 0
+        return self.pellet_count == 0
 
     async def _reset_player(self, player_id):
         """Reset a specific player when they die"""
@@ -786,11 +863,10 @@ class GameRoom:
             player["keys"] = set()
 
             # Reset the maze for this room (preserve per-room seed)
-            self.maze = self._generate_maze(self._maze_seed)
+            self._reset_maze()
 
     async def _broadcast_game_state(self):
         """Broadcast game state to all clients in this room"""
-        total_pellets = sum(row.count(2) + row.count(3) for row in self.maze)
         alive_players = sum(1 for p in self.players.values() if not p["dead"])
         victory = self._check_victory()
 
@@ -807,7 +883,7 @@ class GameRoom:
                 "direction": player.get("direction")
             }
 
-        payload = json.dumps({
+        state = {
             "room_id": self.room_id,
             "players": players_data,
             "ghosts": [
@@ -819,41 +895,68 @@ class GameRoom:
                 }
                 for g in self.ghosts
             ],
-            "maze": self.maze,
             "game_stats": {
-                "total_pellets": total_pellets,
+                "total_pellets": self.pellet_count,
                 "alive_players": alive_players,
                 "total_players": len(self.players),
                 "victory": victory,
-                "game_tick": self.game_tick,
                 "max_players": self.MAX_PLAYERS
             }
-        })
-
-        # Initialize in-flight tracking on first use
-        if not hasattr(self, "_send_in_flight"):
-            self._send_in_flight = {}
-
-        disconnected = set()
-
-        async def _send_one(ws):
-            try:
-                await ws.send(payload)
-            except websockets.ConnectionClosed:
-                disconnected.add(ws)
-            finally:
-                self._send_in_flight.pop(ws, None)
-
-        for ws in list(self.clients):
-            # Coalesce: if a previous send to this ws is still in flight, skip this frame for that ws
-            inflight = self._send_in_flight.get(ws)
-            if inflight and not inflight.done():
-                # Drop this frame for this client
-                # Optional: log occasionally
-                # print("[Coalesce] Skipping frame for slow client")
+        }
+        # Maze cells only change when a pellet is eaten; leave the key out otherwise
+        if self._maze_changes:
+            state["maze_diff"] = self._maze_changes
+
+        # Adaptive skip: when nothing but the tick counter changed since the last
+        # frame, only send a heartbeat every IDLE_HEARTBEAT_TICKS ticks
+        idle = state == self._last_state
+        self._last_state = state
+        if (idle and self.game_tick % self.IDLE_HEARTBEAT_TICKS
+                and not self._full_maze_pending
+                and not any(p["pending_msgs"] for p in self.players.values())):
+            return
+        state = dict(state, game_stats=dict(state["game_stats"], game_tick=self.game_tick))
+        payload = encode_bytes(state)
+        self._maze_changes = []
+
+        # Slow-client coalescing: skip this frame for clients whose transport
+        # still has a backlog instead of queueing more state behind it. A skipped
+        # frame loses its maze diff, so those clients resync with the full grid.
+        # Closed connections are caught by a state check here rather than by
+        # exceptions during the send.
+        OPEN = State.OPEN
+        pending = self._full_maze_pending
+        recipients = []
+        disconnected = []
+        for ws in self.clients:
+            if ws.state is not OPEN:
+                disconnected.append(ws)
+            elif ws.transport is not None and ws.transport.get_write_buffer_size() > self.SLOW_CLIENT_BUFFER:
+                pending.add(ws)
+            else:
+                recipients.append(ws)
+
+        # Clients that need a full maze or have queued events get their own
+        # frame; everyone else shares the payload encoded above
+        shared = []
+        for ws in recipients:
+            player = self.players.get(self.player_ids.get(ws))
+            events = player["pending_msgs"] if player is not None else None
+            if ws not in pending and not events:
+                shared.append(ws)
                 continue
-            task = asyncio.create_task(_send_one(ws))
-            self._send_in_flight[ws] = task
+            frame = dict(state)
+            if ws in pending:
+                frame.pop("maze_diff", None)
+                frame["maze"] = self._maze_rows()
+                pending.discard(ws)
+            if events:
+                frame["events"] = events
+                player["pending_msgs"] = []
+            websockets.broadcast([ws], encode_bytes(frame))
+
+        # Synchronous fan-out: one encoded frame written to every transport
+        websockets.broadcast(shared, payload)
 
         for ws in disconnected:
             self.clients.discard(ws)
@@ -861,6 +964,8 @@ class GameRoom:
 
     async def _game_loop(self):
         """Main game loop for this room"""
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
         try:
             while self.running and not self.is_empty():
                 self.game_tick += 1
@@ -870,7 +975,16 @@ class GameRoom:
                 self._check_player_death()
 
                 await self._broadcast_game_state()
-                await asyncio.sleep(0.05)  # 20 FPS
+
+                # Sleep until the next fixed deadline so tick work doesn't stretch
+                # the period; after an overrun, restart the schedule from now
+                next_tick += self.TICK_INTERVAL
+                delay = next_tick - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    next_tick = loop.time()
+                    await asyncio.sleep(0)
         except asyncio.CancelledError:
             pass
         finally:
@@ -1,128 +1,326 @@
 # server/load_balancer.py - WebSocket reverse-proxy load balancer for Pac-Man
 import asyncio
 import argparse
+import heapq
+import itertools
+import logging
+import math
 import os
-import subprocess
-from typing import List, Optional
-from urllib.parse import urlparse, parse_qs
+import random
+import shlex
+from typing import List, Optional, Set, Tuple
+from urllib.parse import urlparse, unquote_plus
 import hashlib
-import json
 
 import websockets
 
+from utils.logger import setup_queue_logging
+from .protocol import MAX_CLIENT_FRAME_BYTES, decode
+
+try:
+    import uvloop  # optional: faster libuv-based event loop when installed
+except ImportError:
+    uvloop = None
+
+
+# Per-connection routing decisions are debug logs (enable with --verbose). main()
+# routes this logger through a queue so the event loop never blocks on stdout
+logger = logging.getLogger("pacman.lb")
+logger.addHandler(logging.NullHandler())
+
+# How long to wait for a hello frame when the URL lacks room/action. Clients send
+# it right after the handshake, so this only needs to cover about one round trip
+HELLO_WAIT_SECS = float(os.getenv("PACMAN_LB_HELLO_WAIT_SECS", "0.25"))
+
+# Pre-encoded error frames for the reject paths
+ERR_ROOM_NOT_FOUND = b'{"type":"error","message":"Room not found."}'
+ERR_NO_BACKEND = b'{"type":"error","message":"No backend available. Please try again later."}'
+ERR_BACKEND_LOST = b'{"type":"error","message":"Selected backend became unavailable. Please reconnect."}'
+
+# An emptied room stays routable this long, so a quick reconnect (or a friend
+# joining late) still finds it
+ROOM_EMPTY_GRACE_SECS = 10.0
+
+# Rendezvous hashing for new rooms, with bounded-load slack: a backend may host
+# at most (1 + eps) x the mean number of rooms before the next-best one is used
+ROOM_LOAD_EPSILON = 0.25
+
+
+def _hash64(key: str) -> int:
+    """Stable 64-bit hash (Python's hash() is salted per process)."""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def extract_route(path: str) -> Tuple[Optional[str], Optional[str]]:
+    """Return (room, action) from a request path's query string.
+    Single pass over the query; like parse_qs, blank values are skipped and
+    the first non-blank value wins. action is lower-cased.
+    """
+    i = path.find("?")
+    if i < 0:
+        return None, None
+    room = action = None
+    for kv in path[i + 1:].split("&"):
+        if room is None and kv.startswith("room="):
+            room = unquote_plus(kv[5:]).strip() or None
+        elif action is None and kv.startswith("action="):
+            action = unquote_plus(kv[7:]).strip().lower() or None
+    return room, action
+
 
 class Backend:
+    __slots__ = (
+        "url", "port", "active_connections", "failures",
+        "cooldown_until", "last_cooldown", "managed", "process", "last_active",
+        "rooms", "heap_stamp",
+    )
+
     def __init__(self, url: str):
         self.url = url
-        self.active = True
+        # Parsed once; autoscale uses it to find free ports
+        try:
+            self.port: Optional[int] = urlparse(url).port
+        except ValueError:
+            self.port = None
         self.active_connections = 0
         self.failures = 0
         self.cooldown_until: float = 0.0
+        self.last_cooldown: float = 1.0
         # autoscale/management fields
         self.managed: bool = False
-        self.process: Optional[subprocess.Popen] = None
+        self.process: Optional[asyncio.subprocess.Process] = None
         self.last_active: float = 0.0
         # Room-based load balancing
-        self.active_rooms: set = set()  # Track which rooms are hosted on this server
-        self.room_player_counts: dict = {}  # room_id -> player_count
-
-    def is_available(self, now: float) -> bool:
-        return self.active and now >= self.cooldown_until
+        # room_id -> player_count for the rooms hosted on this server. A room stays
+        # listed at 0 players until BackendPool expires it
+        self.rooms: dict = {}
+        # Bumped whenever active_connections/last_active change; heap entries
+        # carrying an older stamp are stale (see BackendPool._heap)
+        self.heap_stamp = 0
 
     def on_failure(self, now: float):
         self.failures += 1
-        # Exponential backoff up to 30s
-        cooldown = min(30, 2 ** min(self.failures, 4))
-        self.cooldown_until = now + cooldown
+        # Exponential backoff up to 30s with decorrelated jitter, so retries
+        # against a flapping backend don't all wake up at the same moment
+        self.last_cooldown = min(30.0, random.uniform(1.0, self.last_cooldown * 3.0))
+        self.cooldown_until = now + self.last_cooldown
 
     def on_success(self):
         self.failures = 0
         self.cooldown_until = 0.0
+        self.last_cooldown = 1.0
 
 
 class BackendPool:
+    __slots__ = (
+        "backends", "capacity", "max_rooms_per_server", "loop", "scale_up_needed",
+        "room_to_backend", "_room_timers", "available", "full_backends", "_heap", "_heap_seq",
+    )
+
     def __init__(self, backends: List[str], capacity: int = 0):
         self.backends = [Backend(url) for url in backends]
-        self._lock = asyncio.Lock()
         self.capacity = capacity
+        self.max_rooms_per_server = capacity // 2 if capacity > 0 else 10  # Assume ~2 players per room
+        # Set by main() once the loop is running; cached so hot paths read
+        # loop.time() without going through asyncio.get_event_loop()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        # Set when a backend fills up, or a failure leaves only full ones; the
+        # autoscaler waits on it instead of polling the pool
+        self.scale_up_needed = asyncio.Event()
         # Room-to-backend mapping for consistent routing
         self.room_to_backend: dict = {}  # room_id -> Backend
+        self._room_timers: dict = {}  # room_id -> pending expiry TimerHandle
+        # Backends outside their failure cooldown: the one record of availability.
+        # Maintained on failure/success and by a re-add timer, so picks don't
+        # re-test every backend's cooldown
+        self.available: set = set(self.backends)
+        # Backends at or over max_rooms_per_server, kept in step with every room
+        # add/remove so the "everything is full" check is a set compare, not a scan
+        self.full_backends: set = set()
+        # Least-connections min-heap of (active_connections, last_active, seq,
+        # stamp, backend) with lazy deletion: every counter change pushes a fresh
+        # entry and stale ones are dropped when they surface
+        self._heap: list = []
+        self._heap_seq = itertools.count()
+        for b in self.backends:
+            self._heap_push(b)
+
+    def _heap_push(self, backend: Backend):
+        backend.heap_stamp += 1
+        heapq.heappush(self._heap, (backend.active_connections, backend.last_active,
+                                    next(self._heap_seq), backend.heap_stamp, backend))
+        # Compact once stale entries clearly outnumber live ones
+        if len(self._heap) > 4 * len(self.backends) + 16:
+            self._heap = [e for e in self._heap if e[3] == e[4].heap_stamp]
+            heapq.heapify(self._heap)
+
+    async def add_backend(self, backend: Backend):
+        """Register a new backend.
+        The pool has no lock: every method mutates its state between await points
+        (none of them awaits mid-update), which is atomic on the event loop.
+        """
+        self.backends.append(backend)
+        self.available.add(backend)
+        self._heap_push(backend)
+
+    def mark_failed(self, backend: Backend):
+        """Put a backend into failure cooldown and schedule its return."""
+        backend.on_failure(self.loop.time())
+        self.available.discard(backend)
+        self.loop.call_later(backend.last_cooldown, self._readd_backend, backend, backend.cooldown_until)
+        # Losing the last backend with room to spare is also a reason to scale up
+        if self.all_full():
+            self.scale_up_needed.set()
+
+    def mark_ok(self, backend: Backend):
+        backend.on_success()
+        self.available.add(backend)
+
+    def _readd_backend(self, backend: Backend, cooldown_until: float):
+        # A newer failure extends the cooldown and schedules its own re-add
+        if backend.cooldown_until == cooldown_until:
+            self.available.add(backend)
+
+    def _sync_full(self, backend: Backend):
+        """Re-file a backend in full_backends after its room count changed."""
+        if len(backend.rooms) >= self.max_rooms_per_server:
+            self.full_backends.add(backend)
+        else:
+            self.full_backends.discard(backend)
+
+    def all_full(self) -> bool:
+        """True when every available backend is at room capacity."""
+        return self.available <= self.full_backends
+
+    def _rendezvous_pick(self, token: str, available: Set[Backend]) -> Backend:
+        """Rendezvous (highest random weight) hashing with bounded loads: rank the
+        available backends by hash(url, token) and take the best one below the room cap.
+        Adding or removing a backend only moves the rooms that rank it first."""
+        total_rooms = sum(len(b.rooms) for b in available) + 1
+        cap = math.ceil((1 + ROOM_LOAD_EPSILON) * total_rooms / len(available))
+        ranked = sorted(available, key=lambda b: _hash64(f"{b.url}#{token}"), reverse=True)
+        for b in ranked:
+            if len(b.rooms) < cap:
+                return b
+        return ranked[0]
 
     async def pick_backend(self) -> Optional[Backend]:
         """Least-connections selection across available backends."""
-        async with self._lock:
-            now = asyncio.get_event_loop().time()
-            candidates = [b for b in self.backends if b.is_available(now)]
-            if not candidates:
-                return None
-            # Choose backend with the fewest active connections (classic least-connections)
-            # Tie-breaker by last_active to avoid sticking to index 0 on cold start
-            chosen = min(candidates, key=lambda b: (b.active_connections, b.last_active))
-            chosen.active_connections += 1
-            chosen.last_active = now
-            return chosen
-
-    async def pick_backend_for_token(self, token: str, is_create: Optional[bool] = None) -> Optional[Backend]:
-        """Sticky rooms + intent-aware selection.
+        now = self.loop.time()
+        heap = self._heap
+        cooling = []
+        chosen = None
+        # Fewest active connections first (classic least-connections), tie-broken
+        # by last_active to avoid sticking to index 0 on cold start
+        while heap:
+            entry = heapq.heappop(heap)
+            backend = entry[4]
+            if entry[3] != backend.heap_stamp:
+                continue  # stale
+            if backend in self.available:
+                chosen = backend
+                break
+            cooling.append(entry)
+        for entry in cooling:
+            heapq.heappush(heap, entry)
+        if chosen is None:
+            return None
+        chosen.active_connections += 1
+        chosen.last_active = now
+        self._heap_push(chosen)
+        return chosen
+
+    async def pick_backend_for_token(self, token: str, is_create: Optional[bool] = None) -> Tuple[Optional[Backend], bool]:
+        """Sticky rooms + intent-aware selection. Returns (backend, is_new_room).
         - If room already mapped: route there (join/create).
-        - If creating: choose backend with the fewest active rooms and establish mapping.
-        - If joining and no mapping exists: return None (room not found at LB).
+        - If creating: place the room by rendezvous hashing and establish mapping.
+        - If joining and no mapping exists: return (None, False) (room not found at LB).
         """
-        async with self._lock:
-            now = asyncio.get_event_loop().time()
-            available = [b for b in self.backends if b.is_available(now)]
-            if not available and not self.backends:
-                return None
-            
-            # Existing mapping
-            existing_backend = self.room_to_backend.get(token)
-            if existing_backend and existing_backend in available:
-                existing_backend.active_connections += 1
-                existing_backend.last_active = now
-                if token in existing_backend.room_player_counts:
-                    existing_backend.room_player_counts[token] = existing_backend.room_player_counts.get(token, 0) + 1
-                print(f"[LB] Room '{token}' exists on {existing_backend.url}, routing there")
-                return existing_backend
-            
-            # Create new room: choose backend with least active rooms
-            if is_create is True:
-                if not available:
-                    return None
-                candidate = min(available, key=lambda b: len(b.active_rooms))
-                candidate.active_connections += 1
-                candidate.last_active = now
-                self.room_to_backend[token] = candidate
-                candidate.active_rooms.add(token)
-                candidate.room_player_counts[token] = candidate.room_player_counts.get(token, 0) + 1
-                print(f"[LB] New room '{token}' assigned to {candidate.url} (rooms: {len(candidate.active_rooms)})")
-                return candidate
-            
-            # Join requested but we have no mapping for this token
-            print(f"[LB] Join requested for unknown room '{token}'")
-            return None
+        now = self.loop.time()
+        if not self.backends:
+            return None, False
+        
+        # Existing mapping
+        existing_backend = self.room_to_backend.get(token)
+        if existing_backend and existing_backend in self.available:
+            existing_backend.active_connections += 1
+            existing_backend.last_active = now
+            self._heap_push(existing_backend)
+            if token in existing_backend.rooms:
+                existing_backend.rooms[token] += 1
+            logger.debug("[LB] Room '%s' exists on %s, routing there", token, existing_backend.url)
+            return existing_backend, False
+        
+        # Create new room: place it by rendezvous hashing, bounded by room load
+        if is_create is True:
+            available = self.available
+            if not available:
+                return None, False
+            candidate = self._rendezvous_pick(token, available)
+            candidate.active_connections += 1
+            candidate.last_active = now
+            self._heap_push(candidate)
+            self.room_to_backend[token] = candidate
+            candidate.rooms[token] = candidate.rooms.get(token, 0) + 1
+            self._sync_full(candidate)
+            if candidate in self.full_backends:
+                self.scale_up_needed.set()
+            logger.debug("[LB] New room '%s' assigned to %s (rooms: %d)", token, candidate.url, len(candidate.rooms))
+            return candidate, True
+        
+        # Join requested but we have no mapping for this token
+        logger.debug("[LB] Join requested for unknown room '%s'", token)
+        return None, False
 
     async def release_backend(self, backend: Backend):
-        async with self._lock:
-            backend.active_connections = max(0, backend.active_connections - 1)
-            backend.last_active = asyncio.get_event_loop().time()
+        backend.active_connections = max(0, backend.active_connections - 1)
+        backend.last_active = self.loop.time()
+        self._heap_push(backend)
     
+    def release_room(self, backend: Backend, token: str):
+        """Drop one player from a room's count. An emptied room is forgotten after
+        ROOM_EMPTY_GRACE_SECS unless someone joins it again first."""
+        rooms = backend.rooms
+        if token not in rooms:
+            return
+        remaining = rooms[token] = max(0, rooms[token] - 1)
+        logger.debug("[LB] Player left room '%s' on %s (remaining: %d)", token, backend.url, remaining)
+        if remaining == 0:
+            timer = self._room_timers.pop(token, None)
+            if timer is not None:
+                timer.cancel()
+            self._room_timers[token] = self.loop.call_later(
+                ROOM_EMPTY_GRACE_SECS, self._expire_room, backend, token)
+
+    def _expire_room(self, backend: Backend, token: str):
+        self._room_timers.pop(token, None)
+        if backend.rooms.get(token) == 0:
+            del backend.rooms[token]
+            self._sync_full(backend)
+            if self.room_to_backend.get(token) is backend:
+                del self.room_to_backend[token]
+            logger.info("[LB] Cleaned up stale room '%s' from %s", token, backend.url)
+
     async def update_room_info(self, backend: Backend, room_id: str, player_count: int, room_active: bool):
-        """Update room information from backend servers"""
-        async with self._lock:
-            if room_active and room_id not in backend.active_rooms:
+        """Update room information from backend servers.
+        Runs between await points, so the update is atomic on the event loop.
+        """
+        rooms = backend.rooms
+        if room_active:
+            is_new = room_id not in rooms
+            rooms[room_id] = player_count
+            if is_new:
                 # New room detected
-                backend.active_rooms.add(room_id)
                 self.room_to_backend[room_id] = backend
-                print(f"[LB] Room '{room_id}' started on {backend.url}")
-            
-            if room_active:
-                backend.room_player_counts[room_id] = player_count
-            elif room_id in backend.active_rooms:
-                # Room ended or empty
-                backend.active_rooms.discard(room_id)
-                backend.room_player_counts.pop(room_id, None)
-                self.room_to_backend.pop(room_id, None)
-                print(f"[LB] Room '{room_id}' ended on {backend.url}")
+                self._sync_full(backend)
+                if backend in self.full_backends:
+                    self.scale_up_needed.set()
+                logger.info("[LB] Room '%s' started on %s", room_id, backend.url)
+        elif rooms.pop(room_id, None) is not None:
+            # Room ended or empty
+            self._sync_full(backend)
+            self.room_to_backend.pop(room_id, None)
+            logger.info("[LB] Room '%s' ended on %s", room_id, backend.url)
 
 
 async def bidirectional_proxy(client_ws: websockets.WebSocketClientProtocol, server_ws: websockets.WebSocketClientProtocol):
@@ -131,101 +329,86 @@ async def bidirectional_proxy(client_ws: websockets.WebSocketClientProtocol, ser
             await server_ws.send(msg)
 
     async def s2c():
-        async for msg in server_ws:
-            await client_ws.send(msg)
+        try:
+            async for msg in server_ws:
+                await client_ws.send(msg)
+        except Exception:
+            pass
+        finally:
+            # Backend side ended: closing the client also ends the inline c2s loop
+            await client_ws.close()
 
-    # Run both directions until one side closes
-    done, pending = await asyncio.wait({asyncio.create_task(c2s()), asyncio.create_task(s2c())}, return_when=asyncio.FIRST_COMPLETED)
-    for task in pending:
-        task.cancel()
+    # Run both directions until one side closes. Client->server runs inline on
+    # this task, so each session costs one extra task instead of two; errors on
+    # either side just end the session, as before
+    s2c_task = asyncio.create_task(s2c())
+    try:
+        await c2s()
+    except Exception:
+        pass
+    finally:
+        s2c_task.cancel()
 
 
 async def handle_client(websocket: websockets.WebSocketServerProtocol, path: Optional[str], pool: BackendPool):
-    # Extract token from query to choose a consistent backend for that room
-    token = None
+    # Extract token (and 'action', for forwarding) from the query to choose a
+    # consistent backend for that room.
     # Prefer websocket.path (often includes query string) over handler's path argument
     req_path = getattr(websocket, "path", None) or path or ""
-    # If handler path lacks query but websocket.path has it, the above covers it.
-    if req_path:
-        parsed = urlparse(req_path)
-        qs = parse_qs(parsed.query)
-        token = (qs.get("room", [None])[0] or "").strip() or None
-    
-    # Also parse 'action' if provided (for forwarding)
-    action = None
-    if req_path:
-        try:
-            parsed_tmp = urlparse(req_path)
-            qs_tmp = parse_qs(parsed_tmp.query)
-            action = (qs_tmp.get("action", [None])[0] or "").strip().lower() or None
-        except Exception:
-            action = None
+    token, action = extract_route(req_path)
 
-    # Peek the first client frame to learn token/action if not present in URL
+    # Peek the first client frame to learn token/action if not present in URL.
+    # A token alone is not enough: without the action, a create can't be told
+    # apart from a join of an unknown room.
     first_msg = None
     if not token or not action:
         try:
-            raw = await asyncio.wait_for(websocket.recv(), timeout=0.8)
+            raw = await asyncio.wait_for(websocket.recv(), timeout=HELLO_WAIT_SECS)
             first_msg = raw
             try:
                 data0 = None
+                # Cheap probe first: only frames mentioning "hello" are worth a JSON parse
                 if isinstance(raw, (bytes, bytearray)):
-                    try:
-                        data0 = json.loads(raw.decode("utf-8", errors="ignore"))
-                    except Exception:
-                        data0 = None
-                else:
-                    data0 = json.loads(raw)
+                    if b'"hello"' in raw:
+                        try:
+                            data0 = decode(raw)
+                        except Exception:
+                            data0 = None
+                elif '"hello"' in raw:
+                    data0 = decode(raw)
                 if isinstance(data0, dict) and data0.get("type") == "hello":
                     if not token:
                         token = (data0.get("room") or "").strip() or None
                     if not action:
                         action = (data0.get("action") or "").strip().lower() or None
-                    try:
-                        print(f"[LB] learned from frame: action='{action or '-'}', token='{token or '-'}'")
-                    except Exception:
-                        pass
+                    logger.debug("[LB] learned from frame: action='%s', token='%s'", action or '-', token or '-')
             except Exception:
                 pass
         except Exception:
             pass
 
+    is_new_room = False
     if token:
         is_create_flag = (action == "create") if action else None
-        backend: Optional[Backend] = await pool.pick_backend_for_token(token, is_create=is_create_flag)
+        backend, is_new_room = await pool.pick_backend_for_token(token, is_create=is_create_flag)
     else:
-        backend: Optional[Backend] = await pool.pick_backend()
+        backend = await pool.pick_backend()
     if not backend:
         # No backend available or unknown room token
         try:
             if token and action == "join":
-                await websocket.send('{"type": "error", "message": "Room not found."}')
+                await websocket.send(ERR_ROOM_NOT_FOUND)
             else:
-                await websocket.send('{"type": "error", "message": "No backend available. Please try again later."}')
+                await websocket.send(ERR_NO_BACKEND)
         finally:
             await websocket.close()
         return
-    
-    # Room-based overload check: if all available backends are at room capacity, return overload
-    now = asyncio.get_event_loop().time()
-    available = [b for b in pool.backends if b.is_available(now)]
-    # Check if we're creating a new room and all servers are at room capacity
-    max_rooms_per_server = pool.capacity // 2 if pool.capacity > 0 else 10  # Assume ~2 players per room
-    if token and token not in pool.room_to_backend:  # New room
-        if available and all(len(b.active_rooms) >= max_rooms_per_server for b in available):
-            try:
-                await websocket.send('{"type": "error", "message": "All servers are hosting maximum rooms. Please try again later."}')
-            finally:
-                await websocket.close()
-            return
 
     # Debug/ops log: show routing decision
-    try:
-        room_info = f" (rooms: {len(backend.active_rooms)})" if hasattr(backend, 'active_rooms') else ""
-        action = "joining existing room" if token and token in pool.room_to_backend else "creating new room" if token else "auto-assignment"
-        print(f"[LB] {action} - path='{req_path}' token='{token or 'none'}' -> {backend.url}{room_info}")
-    except Exception:
-        pass
+    if logger.isEnabledFor(logging.DEBUG):
+        room_info = f" (rooms: {len(backend.rooms)})"
+        route = "creating new room" if is_new_room else "joining existing room" if token else "auto-assignment"
+        logger.debug("[LB] %s - path='%s' token='%s' -> %s%s", route, req_path, token or 'none', backend.url, room_info)
 
     try:
         # Attempt to connect to backend
@@ -238,9 +421,10 @@ async def handle_client(websocket: websockets.WebSocketServerProtocol, path: Opt
                 else:
                     dest_url = f"{backend.url}/{req_path}"
             # Connect to backend. For maximum compatibility across websockets versions,
-            # avoid passing extra headers here.
-            async with websockets.connect(dest_url, open_timeout=5) as backend_ws:
-                backend.on_success()
+            # avoid passing extra headers here. The proxy hop is uncompressed: frames
+            # are small JSON and deflate would cost CPU on every forwarded message.
+            async with websockets.connect(dest_url, open_timeout=5, compression=None) as backend_ws:
+                pool.mark_ok(backend)
                 # If we consumed a first client frame (e.g., hello), forward it to the backend first
                 if first_msg is not None:
                     try:
@@ -250,20 +434,16 @@ async def handle_client(websocket: websockets.WebSocketServerProtocol, path: Opt
                 await bidirectional_proxy(websocket, backend_ws)
         except Exception as e:
             # Mark backend failure and close client
-            backend.on_failure(asyncio.get_event_loop().time())
+            pool.mark_failed(backend)
+            logger.warning("[LB] Backend failure for token='%s' url=%s: %s", token or '-', backend.url, e)
             try:
-                print(f"[LB] Backend failure for token='{token or '-'}' url={backend.url}: {e}")
-            except Exception:
-                pass
-            try:
-                await websocket.send('{"type": "error", "message": "Selected backend became unavailable. Please reconnect."}')
+                await websocket.send(ERR_BACKEND_LOST)
             finally:
                 await websocket.close()
     finally:
         # Decrease room player count if we know which room this was for
-        if token and backend and token in backend.room_player_counts:
-            backend.room_player_counts[token] = max(0, backend.room_player_counts[token] - 1)
-            print(f"[LB] Player left room '{token}' on {backend.url} (remaining: {backend.room_player_counts[token]})")
+        if token and backend:
+            pool.release_room(backend, token)
         await pool.release_backend(backend)
 
 
@@ -276,33 +456,31 @@ async def main():
     parser.add_argument("--max-backends", type=int, default=int(os.getenv("PACMAN_LB_MAX_BACKENDS", "3")), help="Maximum number of backend servers when --auto is enabled")
     parser.add_argument("--backend-base-port", type=int, default=int(os.getenv("PACMAN_LB_BACKEND_BASE_PORT", "8766")), help="Starting port for auto-launched backend servers")
     parser.add_argument("--backend-capacity", type=int, default=int(os.getenv("PACMAN_LB_BACKEND_CAPACITY", "20")), help="Approximate client capacity per backend before scaling up")
-    parser.add_argument("--server-launch-cmd", type=str, default=os.getenv("PACMAN_LB_SERVER_LAUNCH_CMD", "python -m server.main --port {port}"), help="Command to launch a backend server; must include {port}")
+    parser.add_argument("--server-launch-cmd", type=str, default=os.getenv("PACMAN_LB_SERVER_LAUNCH_CMD", "python -m server.main --port {port}"), help="Command to launch a backend server (run without a shell); must include {port}")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log per-connection routing decisions")
     args = parser.parse_args()
+    log_listener = setup_queue_logging("pacman.lb", logging.DEBUG if args.verbose else logging.INFO)
 
     initial_backends = [b.strip() for b in args.backends.split(",") if b.strip()]
     pool = BackendPool(initial_backends, capacity=args.backend_capacity)
+    pool.loop = asyncio.get_running_loop()
 
     # spawning helpers
     async def spawn_backend_on_port(port: int):
         cmd = args.server_launch_cmd.format(port=port)
         print(f"Starting backend: {cmd}")
-        proc = subprocess.Popen(cmd, shell=True)
+        # exec directly (no shell): the spawn yields to the loop instead of blocking it
+        proc = await asyncio.create_subprocess_exec(*shlex.split(cmd))
         b = Backend(f"ws://localhost:{port}")
         b.managed = True
         b.process = proc
-        pool.backends.append(b)
+        await pool.add_backend(b)
 
     async def ensure_min_backends():
         if not args.auto:
             return
         # Count existing
-        existing_ports = set()
-        for b in pool.backends:
-            try:
-                p = int(urlparse(b.url).port)
-                existing_ports.add(p)
-            except Exception:
-                pass
+        existing_ports = {b.port for b in pool.backends if b.port is not None}
         # Spawn until min-backends
         while len(pool.backends) < max(args.min_backends, len(initial_backends) or 0):
             # next port
@@ -317,24 +495,18 @@ async def main():
             return
         try:
             while True:
-                await asyncio.sleep(5)
-                now = asyncio.get_event_loop().time()
+                # Edge-triggered: woken when a backend reaches its room capacity
+                await pool.scale_up_needed.wait()
+                pool.scale_up_needed.clear()
                 # Consider available backends
-                available = [b for b in pool.backends if b.is_available(now)]
-                if not available:
+                if not pool.available:
                     continue
                 # Scale up if all available backends are hosting many rooms
-                max_rooms_per_server = args.backend_capacity // 2 if args.backend_capacity > 0 else 10
-                if all(len(b.active_rooms) >= max_rooms_per_server for b in available):
+                if pool.all_full():
                     total = len(pool.backends)
                     if total < args.max_backends:
                         # find next free port
-                        used_ports = set()
-                        for b in pool.backends:
-                            try:
-                                used_ports.add(int(urlparse(b.url).port))
-                            except Exception:
-                                pass
+                        used_ports = {b.port for b in pool.backends if b.port is not None}
                         next_port = args.backend_base_port
                         while next_port in used_ports:
                             next_port += 1
@@ -343,45 +515,6 @@ async def main():
         except asyncio.CancelledError:
             pass
 
-    async def room_monitor_loop():
-        """Monitor backend servers for room state changes"""
-        if not args.auto:
-            return
-        try:
-            while True:
-                await asyncio.sleep(10)  # Check every 10 seconds
-                now = asyncio.get_event_loop().time()
-                for backend in pool.backends:
-                    if not backend.is_available(now):
-                        continue
-                    
-                    try:
-                        # Try to get room stats from backend server
-                        # This would require a separate HTTP endpoint on game servers
-                        # For now, we'll rely on connection patterns and timeouts
-                        
-                        # Clean up rooms that haven't been accessed recently
-                        stale_rooms = []
-                        for room_id in list(backend.active_rooms):
-                            # If no connections to this room recently, mark as potentially stale
-                            if backend.room_player_counts.get(room_id, 0) == 0:
-                                stale_rooms.append(room_id)
-                        
-                        # Clean up stale rooms (this is a simplified approach)
-                        for room_id in stale_rooms:
-                            if backend.room_player_counts.get(room_id, 0) == 0:
-                                backend.active_rooms.discard(room_id)
-                                backend.room_player_counts.pop(room_id, None)
-                                pool.room_to_backend.pop(room_id, None)
-                                print(f"[LB] Cleaned up stale room '{room_id}' from {backend.url}")
-                                
-                    except Exception as e:
-                        # Don't fail the entire monitor for one backend error
-                        pass
-                        
-        except asyncio.CancelledError:
-            pass
-
     print("⚖️  Pac-Man Load Balancer")
     print("==========================")
     print(f"Listening on ws://0.0.0.0:{args.port}")
@@ -397,19 +530,20 @@ async def main():
     async def _handler(ws, path=None):
         await handle_client(ws, path, pool)
 
-    async with websockets.serve(_handler, "0.0.0.0", args.port):
+    # No per-message deflate on the client side either (see handle_client)
+    async with websockets.serve(_handler, "0.0.0.0", args.port, compression=None,
+                                max_size=MAX_CLIENT_FRAME_BYTES):
         autoscale_task = asyncio.create_task(autoscale_loop())
-        room_monitor_task = asyncio.create_task(room_monitor_loop())
         try:
             await asyncio.Event().wait()
         except asyncio.CancelledError:
             pass
         finally:
             autoscale_task.cancel()
-            room_monitor_task.cancel()
+            log_listener.stop()
             # Optional: stop managed backends
             for b in pool.backends:
-                if b.managed and b.process and b.process.poll() is None:
+                if b.managed and b.process and b.process.returncode is None:
                     try:
                         b.process.terminate()
                     except Exception:
@@ -418,6 +552,8 @@ async def main():
 
 if __name__ == "__main__":
     try:
+        if uvloop is not None:
+            uvloop.install()
         asyncio.run(main())
     except KeyboardInterrupt:
         print("\nLoad balancer stopped")
\ No newline at end of file
@@ -3,10 +3,112 @@ import asyncio
 import websockets
 import json
 import argparse
+import cProfile
+import functools
+import logging
 import os
-from urllib.parse import urlparse, parse_qs
+import signal
+import time
+from urllib.parse import unquote_plus
+from utils.logger import setup_queue_logging
+from .protocol import MAX_CLIENT_FRAME_BYTES, decode, encode_bytes
 from .room_manager import room_manager
 
+try:
+    import uvloop  # optional: faster libuv-based event loop when installed
+except ImportError:
+    uvloop = None
+
+# Per-connection events are debug logs (enable with --verbose). main() routes
+# this logger through a queue so the event loop never blocks on stdout
+logger = logging.getLogger("pacman.server")
+logger.addHandler(logging.NullHandler())
+
+# Per-client input rate limit. The token bucket is kept in integers: one token
+# is TOKEN_UNIT, and each nanosecond refills RPS * 1000 units, so the
+# per-message check needs no float math
+TOKEN_UNIT = 10 ** 12
+INPUT_RATE_MILLI = round(float(os.getenv("PACMAN_INPUT_RPS", "30")) * 1000)
+INPUT_BURST = round(float(os.getenv("PACMAN_INPUT_BURST", "10")) * TOKEN_UNIT)
+
+# How long to wait for a hello frame when neither the query nor the LB headers
+# carried action/room. Clients (and the LB, which replays the frame it peeked)
+# send it right after the handshake, so this only needs to cover about one
+# round trip; on expiry the client is auto-assigned
+HELLO_WAIT_SECS = float(os.getenv("PACMAN_HELLO_WAIT_SECS", "0.25"))
+
+# Pre-encoded error frames for the reject paths
+ERR_ROOM_FULL = b'{"type":"error","message":"Room is full."}'
+ERR_ROOM_NOT_FOUND = b'{"type":"error","message":"Room not found. Ask host to start, then retry Join."}'
+ERR_CREATE_FAILED = b'{"type":"error","message":"Could not create room. Try a different code."}'
+ERR_ASSIGN_FAILED = b'{"type":"error","message":"Failed to assign to room"}'
+# Shared, never mutated: queued into the player's next state frame
+RATE_LIMIT_EVENT = {"type": "rate_limit", "message": "Too many inputs; slowing down."}
+
+@functools.lru_cache(maxsize=1024)
+def _assignment_payload(room_id: str) -> bytes:
+    # Both players of a token room get the same frame; encode it once
+    return encode_bytes({
+        "type": "room_assignment",
+        "room_id": room_id,
+        "message": f"Assigned to room {room_id}"
+    })
+
+def _query_value(value: str) -> str:
+    # Percent/plus decoding only when the value actually needs it
+    if "%" in value or "+" in value:
+        return unquote_plus(value)
+    return value
+
+def _parse_query(path: str):
+    """Return (action, room) from a request path's query string, lower-casing
+    action. Single pass over the query; like parse_qs, blank values are skipped
+    and the first non-blank value wins. Missing keys come back as ""."""
+    action = token = ""
+    query = path.partition("?")[2]
+    if query:
+        for kv in query.split("&"):
+            key, _, value = kv.partition("=")
+            if not value:
+                continue
+            if key == "action" and not action:
+                action = _query_value(value).lower()
+            elif key == "room" and not token:
+                token = _query_value(value).strip()
+    return action, token
+
+async def _serve_inputs(websocket, *, _handle=room_manager.handle_player_input,
+                        _queue_event=room_manager.queue_player_event,
+                        _monotonic_ns=time.monotonic_ns):
+    """Rate-limited input loop for one assigned client.
+    The callables are bound as keyword defaults so the per-message path only
+    touches locals."""
+    rate_milli = INPUT_RATE_MILLI
+    burst = INPUT_BURST
+    tokens = burst
+    last_refill = _monotonic_ns()
+    warn_cooldown = 0
+
+    async for message in websocket:
+        try:
+            # Refill token bucket
+            now = _monotonic_ns()
+            tokens = min(burst, tokens + (now - last_refill) * rate_milli)
+            last_refill = now
+            if tokens >= TOKEN_UNIT:
+                tokens -= TOKEN_UNIT
+                await _handle(websocket, message)
+            else:
+                # Drop excess input and occasionally warn
+                if now >= warn_cooldown:
+                    logger.debug("[RateLimit] Dropping input from client due to rate limit")
+                    _queue_event(websocket, RATE_LIMIT_EVENT)
+                    warn_cooldown = now + 1_000_000_000  # warn at most once per second
+        except json.JSONDecodeError:
+            logger.debug("Invalid JSON received from client")
+        except Exception as e:
+            logger.warning("Error handling player input: %s", e)
+
 async def handle_client(websocket, path=None):
     """Handle a new client connection. Supports token-based room create/join via query params.
     Query:
@@ -14,7 +116,7 @@ async def handle_client(websocket, path=None):
       - room=<token>      (when action is provided)
     Compatible with websockets versions that pass either (websocket) or (websocket, path).
     """
-    print("Client connected")
+    logger.debug("Client connected")
     
     try:
         # Parse query params for token-based routing
@@ -25,10 +127,7 @@ async def handle_client(websocket, path=None):
         action_source = "none"
         token_source = "none"
         if req_path:
-            parsed = urlparse(req_path)
-            qs = parse_qs(parsed.query)
-            action = (qs.get("action", [None])[0] or "").lower()
-            token = (qs.get("room", [None])[0] or "").strip()
+            action, token = _parse_query(req_path)
             if action:
                 action_source = "query"
             if token:
@@ -50,11 +149,14 @@ async def handle_client(websocket, path=None):
         first_msg_buffer = None
         if not action or not token:
             try:
-                raw = await asyncio.wait_for(websocket.recv(), timeout=0.75)
-                try:
-                    data = json.loads(raw)
-                except Exception:
-                    data = None
+                raw = await asyncio.wait_for(websocket.recv(), timeout=HELLO_WAIT_SECS)
+                data = None
+                # Cheap probe first: only frames mentioning "hello" are worth a JSON parse
+                if (b'"hello"' if isinstance(raw, (bytes, bytearray)) else '"hello"') in raw:
+                    try:
+                        data = decode(raw)
+                    except Exception:
+                        data = None
                 if isinstance(data, dict) and data.get("type") == "hello":
                     if not action:
                         action = (data.get("action") or "").lower().strip() or None
@@ -70,55 +172,49 @@ async def handle_client(websocket, path=None):
             except Exception:
                 pass
 
-        print(f"[SVR] new connection: action='{action or '-'}' ({action_source}), token='{token or '-'}' ({token_source})")
+        logger.debug("[SVR] new connection: action='%s' (%s), token='%s' (%s)",
+                     action or '-', action_source, token or '-', token_source)
         if action in ("create", "join") and token:
             create_if_missing = (action == "create")
             force_new = False  # keep the token as-is for create
-            print(f"[SVR] handling explicit {action} for token '{token}' (force_new={force_new})")
+            logger.debug("[SVR] handling explicit %s for token '%s' (force_new=%s)", action, token, force_new)
 
             if action == "join":
-                # Wait briefly for the host to create the room on this backend
+                # Wait briefly for the host to create the room on this backend;
+                # room creation wakes the waiter, so there is no polling
                 max_wait = float(os.getenv("PACMAN_JOIN_WAIT_SECS", "12.0"))
-                deadline = asyncio.get_event_loop().time() + max_wait
-                room_id = None
-                while True:
-                    room_id = await room_manager.add_player_to_specific_room(
-                        websocket, token, create_if_missing=False, force_new=False
-                    )
-                    if room_id:
-                        break
-                    # If room exists but is full, abort immediately
+                room_id = await room_manager.add_player_to_specific_room(
+                    websocket, token, create_if_missing=False, force_new=False
+                )
+                if not room_id and token not in room_manager.rooms:
+                    if await room_manager.wait_for_room(token, max_wait):
+                        room_id = await room_manager.add_player_to_specific_room(
+                            websocket, token, create_if_missing=False, force_new=False
+                        )
+                if not room_id:
+                    # The room exists but is full, or it never showed up
                     rm = room_manager.rooms.get(token)
-                    if rm is not None and rm.is_full():
-                        await websocket.send(json.dumps({"type": "error", "message": "Room is full."}))
-                        return
-                    if asyncio.get_event_loop().time() >= deadline:
-                        await websocket.send(json.dumps({"type": "error", "message": "Room not found. Ask host to start, then retry Join."}))
-                        return
-                    await asyncio.sleep(0.25)
+                    await websocket.send(ERR_ROOM_FULL if rm is not None and rm.is_full() else ERR_ROOM_NOT_FOUND)
+                    return
             else:
                 room_id = await room_manager.add_player_to_specific_room(
                     websocket, token, create_if_missing=create_if_missing, force_new=force_new
                 )
                 if not room_id:
                     # Explicit create failed (should be rare): report error
-                    await websocket.send(json.dumps({"type": "error", "message": "Could not create room. Try a different code."}))
+                    await websocket.send(ERR_CREATE_FAILED)
                     return
         
         # Fallback: automatic assignment
         if not room_id:
-            print("[SVR] no action/token => auto-assign path")
+            logger.debug("[SVR] no action/token => auto-assign path")
             room_id = await room_manager.assign_player_to_room(websocket)
         if not room_id:
-            await websocket.send(json.dumps({"type": "error", "message": "Failed to assign to room"}))
+            await websocket.send(ERR_ASSIGN_FAILED)
             return
         
         # Send initial room assignment message
-        await websocket.send(json.dumps({
-            "type": "room_assignment", 
-            "room_id": room_id,
-            "message": f"Assigned to room {room_id}"
-        }))
+        await websocket.send(_assignment_payload(room_id))
 
         # If we buffered a non-hello message before assignment, process it once
         if 'first_msg_buffer' in locals() and first_msg_buffer:
@@ -127,48 +223,19 @@ async def handle_client(websocket, path=None):
             except Exception:
                 pass
         
-# Rate limiting config
-        RATE = float(os.getenv("PACMAN_INPUT_RPS", "30"))
-        BURST = float(os.getenv("PACMAN_INPUT_BURST", "10"))
-        tokens = BURST
-        last_refill = asyncio.get_event_loop().time()
-        warn_cooldown = 0.0
-
         # Handle messages from the client
-        async for message in websocket:
-            try:
-                # Refill token bucket
-                now = asyncio.get_event_loop().time()
-                elapsed = now - last_refill
-                last_refill = now
-                tokens = min(BURST, tokens + elapsed * RATE)
-                if tokens >= 1.0:
-                    tokens -= 1.0
-                    await room_manager.handle_player_input(websocket, message)
-                else:
-                    # Drop excess input and occasionally warn
-                    if now >= warn_cooldown:
-                        print("[RateLimit] Dropping input from client due to rate limit")
-                        try:
-                            await websocket.send(json.dumps({"type": "rate_limit", "message": "Too many inputs; slowing down."}))
-                        except Exception:
-                            pass
-                        warn_cooldown = now + 1.0  # warn at most once per second
-            except json.JSONDecodeError:
-                print("Invalid JSON received from client")
-            except Exception as e:
-                print(f"Error handling player input: {e}")
-                
+        await _serve_inputs(websocket)
+
     except websockets.ConnectionClosedOK:
-        print("Client disconnected normally")
+        logger.debug("Client disconnected normally")
     except websockets.ConnectionClosedError as e:
-        print(f"Client disconnected with error: {e}")
+        logger.debug("Client disconnected with error: %s", e)
     except Exception as e:
-        print(f"Unexpected error in handle_client: {e}")
+        logger.warning("Unexpected error in handle_client: %s", e)
     finally:
         # Remove player from their room
         await room_manager.remove_player_from_room(websocket)
-        print("Client connection cleaned up")
+        logger.debug("Client connection cleaned up")
 
 async def status_reporter():
     """Periodically report server status"""
@@ -177,18 +244,21 @@ async def status_reporter():
             await asyncio.sleep(30)  # Report every 30 seconds
             stats = room_manager.get_room_stats()
             if stats['total_players'] > 0:
-                print(f"=== SERVER STATUS ===")
-                print(f"Active Rooms: {stats['active_rooms']}")
-                print(f"Total Players: {stats['total_players']}")
+                # One record per report, so the lines stay together in the log
+                lines = ["=== SERVER STATUS ===",
+                         f"Active Rooms: {stats['active_rooms']}",
+                         f"Total Players: {stats['total_players']}"]
                 for room in stats['rooms']:
                     if not room['is_empty']:
-                        print(f"  Room {room['room_id']}: {room['players']}/{room['max_players']} players")
-                print("====================")
+                        lines.append(f"  Room {room['room_id']}: {room['players']}/{room['max_players']} players")
+                lines.append("====================")
+                logger.info("\n".join(lines))
     except asyncio.CancelledError:
         pass
 
-async def main(port: int = 8765):
+async def main(port: int = 8765, verbose: bool = False):
     """Main server function"""
+    log_listener = setup_queue_logging("pacman.server", logging.DEBUG if verbose else logging.INFO)
     print("🎮 Room-Based Pac-Man Multiplayer Server")
     print("========================================")
     print("Features:")
@@ -205,7 +275,13 @@ async def main(port: int = 8765):
     
     try:
         # Start WebSocket server
-        async with websockets.serve(handle_client, "0.0.0.0", port):
+        # No permessage-deflate: state frames are small and latency-sensitive, and
+        # per-connection zlib contexts cost memory and CPU on every send.
+        # max_size/max_queue bound per-connection inbound memory: oversized frames
+        # close the connection, and a flooding client backs up on its own socket
+        # instead of in server memory
+        async with websockets.serve(handle_client, "0.0.0.0", port, compression=None,
+                                    max_size=MAX_CLIENT_FRAME_BYTES, max_queue=4):
             print(f"\n✅ Server running on ws://localhost:{port}")
             print("Players will be automatically assigned to rooms (max 2 per room)")
             print("Press Ctrl+C to stop the server\n")
@@ -220,13 +296,31 @@ async def main(port: int = 8765):
         status_task.cancel()
         await room_manager.stop()
         print("✅ Server stopped successfully")
+        log_listener.stop()
 
 if __name__ == "__main__":
     try:
         parser = argparse.ArgumentParser(description="Room-Based Pac-Man Server")
         parser.add_argument("--port", type=int, default=int(os.getenv("PACMAN_SERVER_PORT", "8765")), help="Port to bind the game server on")
+        parser.add_argument("-v", "--verbose", action="store_true", help="Log per-connection events")
         args = parser.parse_args()
-        asyncio.run(main(port=args.port))
+        if uvloop is not None:
+            uvloop.install()
+        # PACMAN_PROFILE=<file>: cProfile the whole run and write the stats there on
+        # exit. SIGTERM unwinds like Ctrl+C so a killed server still writes them
+        profile_path = os.getenv("PACMAN_PROFILE")
+        profiler = None
+        if profile_path:
+            profiler = cProfile.Profile()
+            signal.signal(signal.SIGTERM, signal.default_int_handler)
+            profiler.enable()
+        try:
+            asyncio.run(main(port=args.port, verbose=args.verbose))
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(profile_path)
+                print(f"Profile written to {profile_path}")
     except KeyboardInterrupt:
         print("\nServer stopped")
     except Exception as e:
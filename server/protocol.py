@@ -1,10 +1,30 @@
 # server/protocol.py
 import json
 
+try:
+    import orjson  # optional: much faster encoder/decoder when installed
+except ImportError:
+    orjson = None
+
+# Compact JSON: no whitespace after separators
+COMPACT_SEPARATORS = (",", ":")
+
+# Largest frame a client may send. Inputs and hello frames are well under
+# 100 bytes; anything bigger is closed by websockets with code 1009
+MAX_CLIENT_FRAME_BYTES = 4096
+
 def encode(msg: dict) -> str:
     """Convert a Python dict to a JSON string."""
     return json.dumps(msg)
 
-def decode(text: str) -> dict:
-    """Convert a JSON string back to a Python dict."""
+def encode_bytes(msg: dict) -> bytes:
+    """Convert a Python dict to compact UTF-8 JSON bytes, using orjson if available."""
+    if orjson is not None:
+        return orjson.dumps(msg, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(msg, separators=COMPACT_SEPARATORS).encode("utf-8")
+
+def decode(text) -> dict:
+    """Convert a JSON string (or UTF-8 bytes) back to a Python dict, using orjson if available."""
+    if orjson is not None:
+        return orjson.loads(text)
     return json.loads(text)
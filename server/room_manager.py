@@ -1,5 +1,6 @@
 # server/room_manager.py
 import asyncio
+import logging
 import time
 import uuid
 import os
@@ -7,6 +8,10 @@ import websockets
 from typing import Dict, Optional, Set
 from .game_room import GameRoom
 
+# Shares the game server's logger; server.main routes it through a queue
+logger = logging.getLogger("pacman.server")
+logger.addHandler(logging.NullHandler())
+
 class RoomManager:
     """Manages multiple game rooms and assigns players to available rooms"""
     
@@ -19,11 +24,14 @@ class RoomManager:
         # - "fill": default behavior (fill partially full rooms before creating new)
         # - "solo": always create a fresh room for auto-assigned players
         self.matchmaking_policy = os.getenv("PACMAN_MATCHMAKING", "solo").lower().strip() or "solo"
+        # Joiners waiting for a room ID that doesn't exist yet:
+        # room_id -> [Event set when the room is created, number of waiters]
+        self._room_waiters: Dict[str, list] = {}
         
     async def start(self):
         """Start the room manager"""
         self._cleanup_task = asyncio.create_task(self._cleanup_loop())
-        print("Room Manager started")
+        logger.info("Room Manager started")
     
     async def stop(self):
         """Stop the room manager and all rooms"""
@@ -34,7 +42,7 @@ class RoomManager:
         for room in list(self.rooms.values()):
             await self._cleanup_room(room.room_id)
         
-        print("Room Manager stopped")
+        logger.info("Room Manager stopped")
     
     async def assign_player_to_room(self, websocket) -> Optional[str]:
         """Assign a player to a room.
@@ -51,14 +59,14 @@ class RoomManager:
         if self.matchmaking_policy == "solo":
             room_id = str(uuid.uuid4())[:8]
             new_room = GameRoom(room_id)
-            self.rooms[room_id] = new_room
-            print(f"[MM solo] Created new room: {room_id}")
+            self._register_room(new_room)
+            logger.info("[MM solo] Created new room: %s", room_id)
             success = await new_room.add_player(websocket)
             if success:
                 self.player_to_room[player_id] = room_id
-                print(f"Player {player_id} assigned to room {room_id}")
+                logger.debug("Player %s assigned to room %s", player_id, room_id)
                 return room_id
-            print("[MM solo] add_player failed unexpectedly")
+            logger.warning("[MM solo] add_player failed unexpectedly")
             return None
         
         # Fill mode: find an available room (not full)
@@ -72,15 +80,15 @@ class RoomManager:
         if available_room is None:
             room_id = str(uuid.uuid4())[:8]  # Short room ID
             available_room = GameRoom(room_id)
-            self.rooms[room_id] = available_room
-            print(f"Created new room: {room_id}")
+            self._register_room(available_room)
+            logger.info("Created new room: %s", room_id)
         
         # Add player to the room
         success = await available_room.add_player(websocket)
         if success:
             self.player_to_room[player_id] = available_room.room_id
-            print(f"Player {player_id} assigned to room {available_room.room_id}")
-            print(f"Room {available_room.room_id} now has {len(available_room.players)} players")
+            logger.debug("Player %s assigned to room %s (%d players)",
+                         player_id, available_room.room_id, len(available_room.players))
             return available_room.room_id
         
         return None
@@ -105,39 +113,65 @@ class RoomManager:
                 suffix = str(uuid.uuid4())[:4]
                 effective_id = f"{effective_id}-{suffix}"
             room = GameRoom(effective_id)
-            self.rooms[effective_id] = room
-            print(f"[MM force_new] Created room: {effective_id}")
+            self._register_room(room)
+            logger.info("[MM force_new] Created room: %s", effective_id)
             success = await room.add_player(websocket)
             if success:
                 self.player_to_room[player_id] = room.room_id
-                print(f"[MM force_new] Player {player_id} joined room {room.room_id}")
-                print(f"[MM force_new] Room {room.room_id} now has {len(room.players)} players")
+                logger.debug("[MM force_new] Player %s joined room %s (%d players)",
+                             player_id, room.room_id, len(room.players))
                 return room.room_id
-            print("[MM force_new] add_player failed unexpectedly")
+            logger.warning("[MM force_new] add_player failed unexpectedly")
             return None
         
         # Default behavior: join if exists and not full; optionally create if missing
         room = self.rooms.get(room_id)
         if room is None and create_if_missing:
             room = GameRoom(room_id)
-            self.rooms[room_id] = room
-            print(f"Created room with token: {room_id}")
+            self._register_room(room)
+            logger.info("Created room with token: %s", room_id)
         
         if room is None:
             return None
         
         if room.is_full():
-            print(f"Room {room_id} is full")
+            logger.debug("Room %s is full", room_id)
             return None
         
         success = await room.add_player(websocket)
         if success:
             self.player_to_room[player_id] = room.room_id
-            print(f"Player {player_id} joined room {room.room_id}")
-            print(f"Room {room.room_id} now has {len(room.players)} players")
+            logger.debug("Player %s joined room %s (%d players)", player_id, room.room_id, len(room.players))
             return room.room_id
         return None
     
+    def _register_room(self, room: GameRoom):
+        """Track a newly created room and wake anyone waiting to join it"""
+        self.rooms[room.room_id] = room
+        waiter = self._room_waiters.pop(room.room_id, None)
+        if waiter is not None:
+            waiter[0].set()
+
+    async def wait_for_room(self, room_id: str, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for a room with this ID to be created.
+        Returns True if the room exists."""
+        if room_id in self.rooms:
+            return True
+        waiter = self._room_waiters.get(room_id)
+        if waiter is None:
+            waiter = self._room_waiters[room_id] = [asyncio.Event(), 0]
+        waiter[1] += 1
+        try:
+            await asyncio.wait_for(waiter[0].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            waiter[1] -= 1
+            # Last one out of a room that never appeared drops the entry
+            if waiter[1] == 0 and self._room_waiters.get(room_id) is waiter:
+                del self._room_waiters[room_id]
+        return room_id in self.rooms
+
     async def remove_player_from_room(self, websocket):
         """Remove a player from their room"""
         player_id = id(websocket)
@@ -150,8 +184,7 @@ class RoomManager:
         
         if room:
             await room.remove_player(websocket)
-            print(f"Player {player_id} removed from room {room_id}")
-            print(f"Room {room_id} now has {len(room.players)} players")
+            logger.debug("Player %s removed from room %s (%d players)", player_id, room_id, len(room.players))
             
             # Schedule room cleanup if empty
             if room.is_empty():
@@ -172,6 +205,12 @@ class RoomManager:
         if room:
             await room.handle_input(websocket, message)
     
+    def queue_player_event(self, websocket, event: Dict):
+        """Queue a message for a player, delivered with their room's next state frame"""
+        room = self.get_room_for_player(websocket)
+        if room:
+            room.queue_event(websocket, event)
+    
     def get_room_for_player(self, websocket) -> Optional[GameRoom]:
         """Get the room that a player is in"""
         player_id = id(websocket)
@@ -238,7 +277,7 @@ class RoomManager:
         
         # Remove the room
         del self.rooms[room_id]
-        print(f"Cleaned up room: {room_id}")
+        logger.info("Cleaned up room: %s", room_id)
     
     async def _cleanup_loop(self):
         """Periodic cleanup of empty rooms"""
@@ -261,7 +300,8 @@ class RoomManager:
                 # Log stats periodically
                 if len(self.rooms) > 0:
                     stats = self.get_room_stats()
-                    print(f"Room Stats - Active: {stats['active_rooms']}, Total: {stats['total_rooms']}, Players: {stats['total_players']}")
+                    logger.info("Room Stats - Active: %d, Total: %d, Players: %d",
+                                stats['active_rooms'], stats['total_rooms'], stats['total_players'])
                     
         except asyncio.CancelledError:
             pass
@@ -1,4 +1,5 @@
 # server/state.py
+from .protocol import encode_bytes
 
 class GameState:
     """Authoritative world state for the 2-player Pac-Man game."""
@@ -6,13 +7,27 @@ class GameState:
     WIDTH = 640
     HEIGHT = 480
     SPEED = 5
+    # Positions are sprite centres (client/renderer.py draws radius-15 circles),
+    # so clamp to the field inset by the radius, folded once at class creation
+    PLAYER_RADIUS = 15
+    X_MIN, X_MAX = PLAYER_RADIUS, WIDTH - PLAYER_RADIUS
+    Y_MIN, Y_MAX = PLAYER_RADIUS, HEIGHT - PLAYER_RADIUS
+    # (vx, vy) per direction key
+    VELOCITIES = {
+        "UP": (0, -SPEED),
+        "DOWN": (0, SPEED),
+        "LEFT": (-SPEED, 0),
+        "RIGHT": (SPEED, 0),
+    }
 
     def __init__(self):
         # { websocket : {"x":.., "y":.., "vx":.., "vy":.., "color":..} }
         self.players = {}
         self.colors = ["yellow", "cyan"]
+        # Encoded snapshot, shared by every recipient until the world changes
+        self._snapshot_bytes = None
 
-    async def add_player(self, ws):
+    def add_player(self, ws):
         """Register a new player and assign a colour."""
         if not self.colors:
             return False
@@ -24,33 +39,35 @@ class GameState:
             "vy": 0,
             "color": color,
         }
+        self._snapshot_bytes = None
         return True
 
-    async def remove_player(self, ws):
-        if ws in self.players:
-            color = self.players[ws]["color"]
-            self.players.pop(ws)
-            self.colors.insert(0, color)
+    def remove_player(self, ws):
+        p = self.players.pop(ws, None)
+        if p is not None:
+            self.colors.insert(0, p["color"])
+            self._snapshot_bytes = None
 
-    async def handle_input(self, ws, action):
+    def handle_input(self, ws, action):
         """Process a keypress from a client."""
         p = self.players.get(ws)
         if not p:
             return
-        if action == "UP":
-            p["vx"], p["vy"] = 0, -self.SPEED
-        elif action == "DOWN":
-            p["vx"], p["vy"] = 0, self.SPEED
-        elif action == "LEFT":
-            p["vx"], p["vy"] = -self.SPEED, 0
-        elif action == "RIGHT":
-            p["vx"], p["vy"] = self.SPEED, 0
+        velocity = self.VELOCITIES.get(action)
+        if velocity is not None:
+            p["vx"], p["vy"] = velocity
 
     def update(self):
-        """Move players each tick, keeping them inside bounds."""
+        """Move players each tick, keeping their whole sprite inside the field."""
+        x_min, x_max = self.X_MIN, self.X_MAX
+        y_min, y_max = self.Y_MIN, self.Y_MAX
         for p in self.players.values():
-            p["x"] = max(0, min(self.WIDTH, p["x"] + p["vx"]))
-            p["y"] = max(0, min(self.HEIGHT, p["y"] + p["vy"]))
+            # Integer clamps as conditional expressions, not max()/min() calls
+            x = p["x"] + p["vx"]
+            y = p["y"] + p["vy"]
+            p["x"] = x_min if x < x_min else x_max if x > x_max else x
+            p["y"] = y_min if y < y_min else y_max if y > y_max else y
+        self._snapshot_bytes = None
 
     def snapshot(self):
         """Return a serializable snapshot of the game world."""
@@ -61,3 +78,10 @@ class GameState:
                 for p in self.players.values()
             ],
         }
+
+    def snapshot_bytes(self):
+        """Return the snapshot encoded once as compact JSON bytes.
+        Broadcast loops should send this same object to every client."""
+        if self._snapshot_bytes is None:
+            self._snapshot_bytes = encode_bytes(self.snapshot())
+        return self._snapshot_bytes
@@ -0,0 +1,25 @@
+# utils/logger.py - Non-blocking logging for the asyncio servers
+import logging
+import logging.handlers
+import queue
+import sys
+
+
+def setup_queue_logging(name: str, level: int = logging.INFO) -> logging.handlers.QueueListener:
+    """Route logger `name` through a queue drained by a background thread.
+
+    The event-loop thread only enqueues records; formatting and the blocking
+    write to stdout happen on the listener thread. Returns the started
+    listener; call .stop() on shutdown to flush what is still queued.
+    """
+    log_queue = queue.SimpleQueue()
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(logging.Formatter("%(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, stream)
+
+    logger = logging.getLogger(name)
+    logger.setLevel(level)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.propagate = False
+    listener.start()
+    return listener